@@ -0,0 +1,131 @@
+# Import necessary libraries
+import re
+import pandas as pd
+
+# Define global variables
+# Unit designators removed before geocoding (same pattern clean_address has always used)
+unit_pattern = re.compile(r'Fl\s[\w\d]+\s|Ste\s[\w\d]+\s|Unit\s[\w\d]+\s|Rm\s[\w\d]+\s')
+unit_extract = re.compile(r'\b(?P<unit>(?:Fl|Ste|Unit|Rm)\s[\w\d]+)\s')
+state_zip_pattern = re.compile(r'[,\s]*\b(?P<state>[A-Za-z]{2})\s+(?P<zip5>\d{5})(?:-?\d{4})?\s*$')
+street_suffixes = ('St', 'Ave', 'Rd', 'Blvd', 'Dr', 'Way', 'Ln', 'Ct', 'Pl', 'Plz', 'Pkwy',
+                   'Hwy', 'Cir', 'Ter', 'Sq', 'Trl', 'Aly', 'Loop', 'Row', 'Real', 'Broadway')
+# Spelled-out USPS street suffixes and directionals, abbreviated the same way
+# for carrier addresses and address points before they are matched
+suffix_abbreviations = {'street': 'st', 'avenue': 'ave', 'av': 'ave', 'road': 'rd', 'boulevard': 'blvd',
+                        'drive': 'dr', 'lane': 'ln', 'court': 'ct', 'place': 'pl', 'plaza': 'plz',
+                        'parkway': 'pkwy', 'highway': 'hwy', 'circle': 'cir', 'terrace': 'ter',
+                        'square': 'sq', 'trail': 'trl', 'alley': 'aly'}
+directional_abbreviations = {'north': 'n', 'south': 's', 'east': 'e', 'west': 'w', 'northeast': 'ne',
+                             'northwest': 'nw', 'southeast': 'se', 'southwest': 'sw'}
+street_abbreviations = {**suffix_abbreviations, **directional_abbreviations}
+street_word_pattern = re.compile(r'\b(?:' + '|'.join(street_abbreviations) + r')\b')
+street_punctuation = re.compile(r'[.,#]')
+street_city_pattern = re.compile(r'^(?P<street>.*\b(?:' + '|'.join(street_suffixes + tuple(word.capitalize() for word in suffix_abbreviations)) + r')\.?)'
+                                 r'[,\s]+(?P<city>[^,\d]+?)[,\s]*$')
+whitespace = re.compile(r'(?:\s|%20)+')
+columns = ['street', 'unit', 'city', 'state', 'zip5', 'geocode_key', 'point_key']
+
+# Define necessary functions
+def geocode_keys(addresses):
+    '''
+    Function that computes the geocode cache key of every address in one
+    vectorized pass; identical to geocode_cache.geocode_key(clean_address(address))
+    -----
+    Input:
+
+    addresses (Series) - Street addresses (missing values allowed)
+    -----
+    Output:
+
+    keys (Series) - Normalized addresses (missing where the address is missing or empty)
+    '''
+    addresses = pd.Series(addresses, dtype=object)
+    text = addresses.where(addresses.map(lambda value: isinstance(value, str)))
+    keys = (text.str.replace(unit_pattern, '', regex=True)
+                .str.replace(whitespace, ' ', regex=True)
+                .str.strip()
+                .str.lower())
+    keys = keys.where(keys.str.len() > 0)
+    return keys.astype(object).where(keys.notna(), None)
+
+def address_point_keys(streets, zip_codes):
+    '''
+    Function that computes the keys used to match addresses against an
+    address-point file (see coordinate_resolver.load_address_points): house
+    number and street with suffixes and directionals abbreviated (e.g.
+    '6TH STREET' and '6th St' both become '6th st'), followed by the ZIP5.
+    City is left out because address-point files often leave it empty.
+    -----
+    Inputs:
+
+    streets (Series) - House number and street (e.g. parse_addresses' street)
+
+    zip_codes (Series) - ZIP codes (ZIP+4 allowed)
+    -----
+    Output:
+
+    keys (Series) - Keys such as '1942 university ave 94704' (missing where the
+                    street or a 5-digit ZIP is missing)
+    -----
+    Example:
+
+    >>> list(address_point_keys(pd.Series(['455 6TH STREET']), pd.Series(['94103-1234'])))
+    ['455 6th st 94103']
+    '''
+    streets = pd.Series(streets, dtype=object)
+    zip_codes = pd.Series(list(zip_codes), index=streets.index, dtype=object)
+    text = (streets.where(streets.map(lambda value: isinstance(value, str)))
+                   .str.lower()
+                   .str.replace(street_punctuation, ' ', regex=True)
+                   .str.replace(street_word_pattern, lambda match: street_abbreviations[match.group(0)], regex=True)
+                   .str.replace(whitespace, ' ', regex=True)
+                   .str.strip())
+    zip5 = zip_codes.where(zip_codes.map(lambda value: isinstance(value, str))).str.strip().str[:5]
+    keys = text + ' ' + zip5
+    keys = keys.where((text.str.len() > 0) & zip5.str.fullmatch(r'\d{5}').fillna(False).astype(bool))
+    return keys.astype(object).where(keys.notna(), None)
+
+def parse_addresses(addresses):
+    '''
+    Function that parses a whole column of single-line addresses (the FHIR
+    Location address.text, e.g. '1942 University Ave Ste 208 Berkeley CA 94704')
+    into structured parts with pandas string methods instead of a Python loop
+    -----
+    Input:
+
+    addresses (Series) - Street addresses (missing values allowed)
+    -----
+    Output:
+
+    parsed (DataFrame) - DataFrame with the same index and columns street,
+                         unit, city, state, zip5, geocode_key and point_key
+                         (see address_point_keys); parts that are missing or
+                         cannot be recognized are None
+    -----
+    Example:
+
+    >>> parse_addresses(pd.Series(['1942 University Ave Ste 208 Berkeley CA 94704'])).iloc[0].to_dict()
+    {'street': '1942 University Ave', 'unit': 'Ste 208', 'city': 'Berkeley',
+     'state': 'CA', 'zip5': '94704', 'geocode_key': '1942 university ave berkeley ca 94704',
+     'point_key': '1942 university ave 94704'}
+    '''
+    addresses = pd.Series(addresses, dtype=object)
+    text = addresses.where(addresses.map(lambda value: isinstance(value, str))) \
+                    .str.replace(whitespace, ' ', regex=True) \
+                    .str.strip()
+    state_zip = text.str.extract(state_zip_pattern)
+    rest = text.str.replace(state_zip_pattern, '', regex=True)
+    unit = (rest + ' ').str.extract(unit_extract)['unit']
+    rest = (rest + ' ').str.replace(unit_pattern, '', regex=True).str.strip()
+    street_city = rest.str.extract(street_city_pattern)
+    street = street_city['street'].fillna(rest) # No recognizable street suffix: keep it all as street
+    parsed = pd.DataFrame({'street': street,
+                           'unit': unit,
+                           'city': street_city['city'],
+                           'state': state_zip['state'].str.upper(),
+                           'zip5': state_zip['zip5'],
+                           'geocode_key': geocode_keys(addresses),
+                           'point_key': address_point_keys(street, state_zip['zip5'])},
+                          index=addresses.index)
+    parsed = parsed.astype(object)
+    return parsed.where(parsed.notna() & (parsed != ''), None)
@@ -0,0 +1,106 @@
+# Import necessary libraries
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+import requests
+from fhir_client import get_session
+
+# Define global variables
+max_per_host = 8 # Default number of requests allowed in flight per host
+
+# Define necessary functions
+def fetch_json(url):
+    '''
+    Helper function that makes a single blocking GET request on the shared
+    session (see fhir_client) and decodes the json body
+    -----
+    Input:
+
+    url (str) - Full API call
+    -----
+    Output:
+
+    json_object (dict) - Decoded json body or None if the request failed,
+                         the server answered with an error status (e.g. a
+                         429 or a json 5xx from a gateway) or decoding failed
+    '''
+    try:
+        request = get_session().get(url)
+        request.raise_for_status()
+        return request.json()
+    except (requests.exceptions.RequestException, ValueError):
+        print(f'Unable to fetch {url}')
+        return None
+
+async def fetch_json_async(url, semaphore, executor):
+    '''
+    Coroutine that runs fetch_json on the thread pool once a slot for the
+    url's host is available
+    -----
+    Inputs:
+
+    url (str) - Full API call
+
+    semaphore (asyncio.Semaphore) - Per-host concurrency limit
+
+    executor (ThreadPoolExecutor) - Pool that the blocking request runs on
+    -----
+    Output:
+
+    json_object (dict) - See fetch_json
+    '''
+    async with semaphore:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(executor, fetch_json, url)
+
+async def gather_json(urls, per_host):
+    '''
+    Coroutine that fetches every url concurrently with at most per_host
+    requests in flight against any single host
+    -----
+    Inputs:
+
+    urls (list) - List of full API calls
+
+    per_host (int) - Maximum number of concurrent requests per host
+    -----
+    Output:
+
+    json_objects (list) - Decoded json bodies in the same order as urls
+    '''
+    semaphores = {}
+    for url in urls:
+        host = urlsplit(url).netloc
+        if host not in semaphores:
+            semaphores[host] = asyncio.Semaphore(per_host)
+    max_workers = max(1, per_host * len(semaphores))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        tasks = [fetch_json_async(url, semaphores[urlsplit(url).netloc], executor)
+                 for url in urls]
+        return await asyncio.gather(*tasks)
+
+def fetch_all(urls, per_host=max_per_host):
+    '''
+    Function that fetches a list of FHIR resource API calls concurrently
+    and returns the decoded json bodies in the same order as urls
+    -----
+    Inputs:
+
+    urls (list) - List of full API calls
+
+    per_host (int) - Maximum number of concurrent requests per host
+    -----
+    Output:
+
+    json_objects (list) - Decoded json bodies; failed requests are None
+    -----
+    Example:
+
+    >>> fetch_all([base_url + 'Location/123', base_url + 'Location/456'])
+    [{'resourceType': 'Location', 'id': '123', ...},
+     {'resourceType': 'Location', 'id': '456', ...}]
+    '''
+    urls = list(urls)
+    if not urls:
+        return []
+    return asyncio.run(gather_json(urls, per_host))
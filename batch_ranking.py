@@ -0,0 +1,145 @@
+# Import necessary libraries
+import numpy as np
+import pandas as pd
+from distance import haversine, valid_coordinates
+from provider_index import ProviderIndex
+
+# Define global variables
+max_chunk_bytes = 64 * 1024 * 1024 # Memory budget of one distance block
+
+# Define necessary functions
+def top_k_nearest(query_lats, query_lons, latitudes, longitudes, k=10,
+                  allowed=None, chunk_bytes=max_chunk_bytes):
+    '''
+    Function that ranks the k nearest points for each of M query points
+    against N candidate points. Haversine distances are computed as blocks of
+    queries x candidates small enough to fit chunk_bytes, and a running top-k
+    per query is merged across candidate blocks, so memory stays bounded for
+    any M and N.
+    -----
+    Inputs:
+
+    query_lats, query_lons (array) - M query coordinates in degrees
+
+    latitudes, longitudes (array) - N candidate coordinates in degrees
+                                    (invalid coordinates are never ranked)
+
+    k (int) - Number of nearest candidates to return per query
+
+    allowed (array) - Optional boolean mask of candidates that may be ranked
+
+    chunk_bytes (int) - Memory budget of one distance block in bytes
+    -----
+    Outputs:
+
+    indices (array) - (M, k) candidate positions, nearest first; -1 where
+                      fewer than k candidates exist
+
+    distances (array) - (M, k) distances in kilometers; inf where indices is -1
+    '''
+    query_lats = np.asarray(query_lats, dtype=float)
+    query_lons = np.asarray(query_lons, dtype=float)
+    latitudes = np.asarray(latitudes, dtype=float)
+    longitudes = np.asarray(longitudes, dtype=float)
+    usable = valid_coordinates(latitudes, longitudes)
+    if allowed is not None:
+        usable &= np.asarray(allowed, dtype=bool)
+    candidates = np.flatnonzero(usable)
+    cand_lats = latitudes[candidates]
+    cand_lons = longitudes[candidates]
+    m = len(query_lats)
+    indices = np.full((m, k), -1, dtype=np.int64)
+    distances = np.full((m, k), np.inf)
+    if not len(candidates) or not m or k <= 0:
+        return indices, distances
+
+    # Block shape: about chunk_bytes / 8 float64 distances per block
+    cells = max(chunk_bytes // 8, k + 1)
+    candidate_block = int(min(len(candidates), max(cells // min(m, 1024), k + 1)))
+    query_block = int(max(1, min(m, cells // candidate_block)))
+    for q_start in range(0, m, query_block):
+        q_stop = min(q_start + query_block, m)
+        best_indices = indices[q_start:q_stop]
+        best_distances = distances[q_start:q_stop]
+        for c_start in range(0, len(candidates), candidate_block):
+            c_stop = min(c_start + candidate_block, len(candidates))
+            block = haversine(query_lats[q_start:q_stop, None], query_lons[q_start:q_stop, None],
+                              cand_lats[None, c_start:c_stop], cand_lons[None, c_start:c_stop])
+            block_indices = np.broadcast_to(candidates[c_start:c_stop], block.shape)
+            # Merge the running top-k with this block and keep the k smallest
+            merged_distances = np.concatenate([best_distances, block], axis=1)
+            merged_indices = np.concatenate([best_indices, block_indices], axis=1)
+            keep = np.argpartition(merged_distances, k - 1, axis=1)[:, :k]
+            best_distances = np.take_along_axis(merged_distances, keep, axis=1)
+            best_indices = np.take_along_axis(merged_indices, keep, axis=1)
+        order = np.argsort(best_distances, axis=1, kind='stable')
+        distances[q_start:q_stop] = np.take_along_axis(best_distances, order, axis=1)
+        indices[q_start:q_stop] = np.where(np.isinf(distances[q_start:q_stop]), -1,
+                                           np.take_along_axis(best_indices, order, axis=1))
+    return indices, distances
+
+def rank_providers(points, providers, k=10, filters=None, provider_index=None):
+    '''
+    Function that lists the k nearest providers for every query point, e.g.
+    every campus building or every city centroid (see city_points)
+    -----
+    Inputs:
+
+    points (DataFrame) - Query points with columns name, latitude and longitude
+
+    providers (DataFrame) - providers.csv or the providers table
+
+    k (int) - Number of providers per point
+
+    filters (dict) - Optional keyword arguments of ProviderIndex.query
+                     (carrier, networks, specialties, cities)
+
+    provider_index (ProviderIndex) - Optional prebuilt index over providers
+                                     (built when filters are given)
+    -----
+    Output:
+
+    ranking (DataFrame) - One row per (point, rank) with the point's name, the
+                          rank (1 = nearest), Distance (km) and the provider's columns
+    '''
+    latitude = 'Latitude' if 'Latitude' in providers else 'latitude'
+    longitude = 'Longitude' if 'Longitude' in providers else 'longitude'
+    providers = providers.reset_index(drop=True)
+    allowed = None
+    if filters:
+        if provider_index is None:
+            provider_index = ProviderIndex(providers)
+        allowed = np.zeros(len(providers), dtype=bool)
+        allowed[provider_index.positions(provider_index.query(**filters))] = True
+    indices, distances = top_k_nearest(points['latitude'].to_numpy(dtype=float),
+                                       points['longitude'].to_numpy(dtype=float),
+                                       pd.to_numeric(providers[latitude], errors='coerce').to_numpy(),
+                                       pd.to_numeric(providers[longitude], errors='coerce').to_numpy(),
+                                       k=k, allowed=allowed)
+    found = indices.ravel() >= 0
+    ranking = providers.iloc[indices.ravel()[found]].reset_index(drop=True)
+    ranking.insert(0, 'Distance', distances.ravel()[found])
+    ranking.insert(0, 'Rank', np.tile(np.arange(1, k + 1), len(points))[found])
+    ranking.insert(0, 'Point', np.repeat(points['name'].to_numpy(), k)[found])
+    return ranking
+
+def city_points(place_index, cities):
+    '''
+    Function that looks up the centroids of cities (e.g. the cities.py lists)
+    in a gazetteer PlaceIndex (see reverse_geocode.load_place_index)
+    -----
+    Inputs:
+
+    place_index (PlaceIndex) - Gazetteer of place centroids
+
+    cities (list) - List of city names
+    -----
+    Output:
+
+    points (DataFrame) - Columns name, latitude and longitude for every city
+                         found in the gazetteer
+    '''
+    places = pd.DataFrame({'name': place_index.names,
+                           'latitude': place_index.latitudes,
+                           'longitude': place_index.longitudes}).drop_duplicates('name')
+    return places[places['name'].isin(list(cities))].reset_index(drop=True)
@@ -0,0 +1,68 @@
+# Import necessary libraries
+import sys
+import time
+import numpy as np
+import pandas as pd
+from distance import haversine
+from spatial_index import ProviderSearch
+
+# Define global variables
+# Usage: python benchmark_spatial_index.py [sizes...]   (default 10000 100000 1000000)
+sizes = [int(size) for size in sys.argv[1:]] or [10_000, 100_000, 1_000_000]
+queries = 200
+bay_area_box = (37.2, 38.4, -122.7, -121.6) # South, north, west, east
+networks = ['Kaiser EPO Network', 'Kaiser HMO Network', 'Kaiser Medi-Cal Network',
+            'Kaiser Point-of-Service Network', 'Kaiser Senior Advantage Network']
+specialties = ['Psychiatry', 'Psychologist', 'Counselor', 'Clinical Social Worker', 'Marriage & Family Therapist']
+cities = ['Berkeley', 'Oakland', 'San Francisco', 'San Jose', 'Walnut Creek']
+
+# Define necessary functions
+def synthetic_providers(n, rng):
+    '''
+    Function that builds n random providers (providers.csv columns) spread
+    over the Bay Area
+    '''
+    south, north, west, east = bay_area_box
+    network_lists = [str(networks[:count]) for count in range(1, len(networks) + 1)]
+    return pd.DataFrame({'id': np.arange(n).astype(str),
+                         'Latitude': rng.uniform(south, north, n),
+                         'Longitude': rng.uniform(west, east, n),
+                         'Specialty': rng.choice(specialties, n),
+                         'Networks': rng.choice(network_lists, n),
+                         'City': rng.choice(cities, n),
+                         'Carrier': rng.choice(['Kaiser', 'UnitedHealthcare'], n)})
+
+def timed(function, points):
+    '''
+    Helper function that returns the mean milliseconds per call over points
+    '''
+    start = time.perf_counter()
+    for lat, lon in points:
+        function(lat, lon)
+    return (time.perf_counter() - start) * 1000 / len(points)
+
+# Run benchmarks
+rng = np.random.default_rng(0)
+filters = {'carrier': 'Kaiser', 'networks': ['Kaiser Medi-Cal Network'], 'specialties': ['Psychiatry']}
+print(f'{"providers":>10} {"build s":>8} {"nearest ms":>11} {"filtered ms":>12} {"within ms":>10} {"full scan ms":>13}')
+for n in sizes:
+    providers = synthetic_providers(n, rng)
+    start = time.perf_counter()
+    search = ProviderSearch(providers)
+    build = time.perf_counter() - start
+    south, north, west, east = bay_area_box
+    points = list(zip(rng.uniform(south, north, queries), rng.uniform(west, east, queries)))
+    latitudes = providers['Latitude'].to_numpy()
+    longitudes = providers['Longitude'].to_numpy()
+
+    nearest = timed(lambda lat, lon: search.nearest(lat, lon, k=10), points)
+    filtered = timed(lambda lat, lon: search.nearest(lat, lon, k=10, filters=filters), points)
+    within = timed(lambda lat, lon: search.within(lat, lon, 2.0), points)
+    full_scan = timed(lambda lat, lon: np.argpartition(haversine(lat, lon, latitudes, longitudes), 10)[:10],
+                      points[:20])
+
+    # Check against a full scan
+    lat, lon = points[0]
+    expected = np.sort(haversine(lat, lon, latitudes, longitudes))[:10]
+    assert np.allclose(search.nearest(lat, lon, k=10)['Distance'].to_numpy(), expected)
+    print(f'{n:>10} {build:>8.2f} {nearest:>11.3f} {filtered:>12.3f} {within:>10.3f} {full_scan:>13.3f}')
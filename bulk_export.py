@@ -0,0 +1,157 @@
+# Import necessary libraries
+import glob
+import json
+import os.path
+import time
+from rate_limit import parse_retry_after
+
+# Define global variables
+bulk_types = ['Location', 'PractitionerRole', 'HealthcareService', 'Practitioner']
+no_store = {'Cache-Control': 'no-store'} # Keep multi-GB NDJSON out of the HTTP cache
+
+# Define necessary functions
+def start_export(base_url, session, resource_types=bulk_types, type_filters=None):
+    '''
+    Function that kicks off a FHIR Bulk Data $export for the given resource types
+    -----
+    Inputs:
+
+    base_url (str) - FHIR server base URL ending in '/'
+
+    session (Session) - requests Session to use (see fhir_client)
+
+    resource_types (list) - Resource types to export
+
+    type_filters (list) - Optional _typeFilter search queries
+                          (e.g. ['Location?address-state=CA'])
+    -----
+    Output:
+
+    status_url (str) - Polling location returned in Content-Location
+    '''
+    params = {'_type': ','.join(resource_types)}
+    if type_filters:
+        params['_typeFilter'] = ','.join(type_filters)
+    headers = {'Accept': 'application/fhir+json',
+               'Prefer': 'respond-async'}
+    headers.update(no_store)
+    request = session.get(base_url + '$export', params=params, headers=headers)
+    if request.status_code != 202:
+        raise RuntimeError(f'$export kick-off failed ({request.status_code}): {request.text[:500]}')
+    return request.headers['Content-Location']
+
+def wait_for_manifest(status_url, session, poll_interval=10):
+    '''
+    Function that polls a $export status URL until the export completes
+    -----
+    Inputs:
+
+    status_url (str) - Polling location returned by start_export
+
+    session (Session) - requests Session to use (see fhir_client)
+
+    poll_interval (float) - Seconds between polls when the server does not
+                            send Retry-After
+    -----
+    Output:
+
+    manifest (dict) - Completed export manifest (json object with an output list)
+    '''
+    while True:
+        request = session.get(status_url, headers=no_store)
+        if request.status_code == 200:
+            return request.json()
+        if request.status_code != 202:
+            raise RuntimeError(f'$export failed ({request.status_code}): {request.text[:500]}')
+        progress = request.headers.get('X-Progress')
+        if progress:
+            print(f'Export in progress: {progress}')
+        delay = parse_retry_after(request.headers.get('Retry-After'))
+        time.sleep(delay if delay is not None else poll_interval)
+
+def manifest_files(manifest):
+    '''
+    Function that lists the NDJSON files in an export manifest
+    -----
+    Input:
+
+    manifest (dict) - Export manifest (see wait_for_manifest)
+    -----
+    Output:
+
+    files (list) - List of (resource type, file URL) tuples
+    '''
+    return [(output.get('type'), output.get('url')) for output in manifest.get('output', [])]
+
+def local_files(directory):
+    '''
+    Function that lists pre-downloaded NDJSON files named <ResourceType>*.ndjson
+    (the file names a $export manifest uses, e.g. Location.ndjson or
+    Location.1.ndjson)
+    -----
+    Input:
+
+    directory (str) - Directory holding the NDJSON files
+    -----
+    Output:
+
+    files (list) - List of (resource type, file path) tuples
+    '''
+    files = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.ndjson'))):
+        resource_type = os.path.basename(path).split('.')[0]
+        files.append((resource_type, path))
+    return files
+
+def iter_ndjson(source, session=None):
+    '''
+    Generator that stream-parses an NDJSON file one resource at a time
+    -----
+    Inputs:
+
+    source (str) - File URL (requires session) or local file path
+
+    session (Session) - requests Session used for URLs
+    -----
+    Output:
+
+    resource (dict) - One json object per non-empty line
+    '''
+    if source.startswith(('http://', 'https://')):
+        headers = {'Accept': 'application/fhir+ndjson'}
+        headers.update(no_store)
+        with session.get(source, headers=headers, stream=True) as request:
+            request.raise_for_status()
+            for line in request.iter_lines():
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        with open(source, 'r') as ndjson_file:
+            for line in ndjson_file:
+                if line.strip():
+                    yield json.loads(line)
+
+def iter_entry_pages(resources, page_size=100):
+    '''
+    Generator that groups resources into Bundle-entry shaped pages
+    ({'resource': ...}) so they normalize to the same columns as a search
+    Bundle (see page_sink.PageSink)
+    -----
+    Inputs:
+
+    resources (iterable) - Stream of json objects (see iter_ndjson)
+
+    page_size (int) - Number of entries per page
+    -----
+    Output:
+
+    entries (list) - List of at most page_size entries
+    '''
+    entries = []
+    for resource in resources:
+        entries.append({'resource': resource})
+        if len(entries) == page_size:
+            yield entries
+            entries = []
+    if entries:
+        yield entries
@@ -0,0 +1,80 @@
+# Import necessary libraries
+import json
+import os.path
+import sys
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+from bulk_export import local_files
+
+# Stand-in FHIR Bulk Data server that serves pre-downloaded NDJSON files
+# Usage: python bulk_stub_server.py <ndjson_directory> [port]
+# Then:  python pull_provider_data.py uhc --bulk http://localhost:<port>/
+ndjson_directory = sys.argv[1]
+port = int(sys.argv[2]) if len(sys.argv) > 2 else 8000
+
+class BulkExportHandler(BaseHTTPRequestHandler):
+    '''
+    Handler implementing the three steps of an asynchronous $export:
+    kick-off (202 + Content-Location), status polling (one 202 with
+    Retry-After, then the manifest) and NDJSON file download
+    '''
+    polled = set()
+
+    def send_json(self, status, body, headers=None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        host = f'http://{self.headers.get("Host", f"localhost:{port}")}'
+        if url.path.endswith('/$export'):
+            types = parse_qs(url.query).get('_type', [''])[0]
+            self.send_response(202)
+            self.send_header('Content-Location', f'{host}/status?_type={types}')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+        elif url.path == '/status':
+            if url.query not in self.polled:
+                self.polled.add(url.query)
+                self.send_response(202)
+                self.send_header('X-Progress', 'Preparing files')
+                self.send_header('Retry-After', '1')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            types = parse_qs(url.query).get('_type', [''])[0].split(',')
+            output = [{'type': resource_type,
+                       'url': f'{host}/files/{os.path.basename(path)}'}
+                      for resource_type, path in local_files(ndjson_directory)
+                      if resource_type in types or types == ['']]
+            self.send_json(200, {'transactionTime': self.date_time_string(),
+                                 'request': f'{host}/$export',
+                                 'requiresAccessToken': False,
+                                 'output': output,
+                                 'error': []})
+        elif url.path.startswith('/files/'):
+            path = os.path.join(ndjson_directory, os.path.basename(url.path))
+            if not os.path.exists(path):
+                self.send_json(404, {'resourceType': 'OperationOutcome'})
+                return
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/fhir+ndjson')
+            self.send_header('Content-Length', str(os.path.getsize(path)))
+            self.end_headers()
+            with open(path, 'rb') as ndjson_file:
+                while True:
+                    chunk = ndjson_file.read(64 * 1024)
+                    if not chunk:
+                        break
+                    self.wfile.write(chunk)
+        else:
+            self.send_json(404, {'resourceType': 'OperationOutcome'})
+
+print(f'Serving {ndjson_directory} as a Bulk Data server on http://localhost:{port}/')
+ThreadingHTTPServer(('', port), BulkExportHandler).serve_forever()
@@ -0,0 +1,63 @@
+# Import necessary libraries
+import pandas as pd
+
+class RecordBuilder:
+    '''
+    Column-oriented record accumulator. Each column is a Python list, so
+    appending a record is amortized O(1) (unlike np.append, which copies the
+    whole array every time), and the DataFrame is built once at the end with
+    each column cast to its declared dtype.
+    -----
+    Input:
+
+    columns (dict) - Dictionary mapping column names to pandas dtypes, in the
+                     order the columns should appear
+                     (e.g. {'id': 'string', 'status': 'boolean'})
+    -----
+    Example:
+
+    >>> records = RecordBuilder({'id': 'string', 'zip': 'string'})
+    >>> records.append(id='123', zip='94710')
+    >>> records.to_frame()
+        id    zip
+    0  123  94710
+    '''
+    def __init__(self, columns):
+        self.dtypes = dict(columns)
+        self.columns = {name: [] for name in self.dtypes}
+
+    def append(self, **values):
+        '''
+        Append a single record; every declared column must be given
+        '''
+        if values.keys() != self.columns.keys():
+            missing = set(self.columns) - set(values)
+            extra = set(values) - set(self.columns)
+            raise KeyError(f'Record does not match columns (missing: {sorted(missing)}, '
+                           f'unexpected: {sorted(extra)})')
+        for name, value in values.items():
+            self.columns[name].append(value)
+
+    def extend(self, other):
+        '''
+        Append every record of another RecordBuilder with the same columns
+        (e.g. one filled on a worker thread)
+        '''
+        if other.columns.keys() != self.columns.keys():
+            raise KeyError(f'Columns do not match ({list(other.columns)} vs {list(self.columns)})')
+        for name, values in other.columns.items():
+            self.columns[name].extend(values)
+
+    def __len__(self):
+        return len(next(iter(self.columns.values()), []))
+
+    def to_frame(self):
+        '''
+        Build the DataFrame from the accumulated columns
+        -----
+        Output:
+
+        df (DataFrame) - Pandas DataFrame with one row per appended record
+        '''
+        return pd.DataFrame({name: pd.Series(values, dtype=self.dtypes[name])
+                             for name, values in self.columns.items()})
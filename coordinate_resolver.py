@@ -0,0 +1,164 @@
+# Import necessary libraries
+import os.path
+import threading
+from collections import Counter
+import pandas as pd
+from address_parser import address_point_keys
+
+# Define global variables
+tiers = ('position', 'cache', 'address_points', 'remote', 'failed', 'missing')
+
+# Define necessary functions
+def load_address_points(path):
+    '''
+    Function that loads an offline address-point file (an OpenAddresses CSV
+    with NUMBER, STREET, POSTCODE, LAT and LON columns) into a dictionary keyed
+    by house number, normalized street and ZIP5 (see
+    address_parser.address_point_keys); CITY is ignored since it is often empty
+    -----
+    Input:
+
+    path (str) - Path of the address-point CSV
+    -----
+    Output:
+
+    points (dict) - Dictionary mapping address-point keys to [latitude, longitude]
+                    strings, or None if path does not exist
+    '''
+    if not os.path.exists(path):
+        return None
+    columns = ['NUMBER', 'STREET', 'POSTCODE', 'LAT', 'LON']
+    points = pd.read_csv(path, usecols=columns, dtype=str).dropna(subset=['NUMBER', 'STREET', 'POSTCODE', 'LAT', 'LON'])
+    keys = address_point_keys(points['NUMBER'] + ' ' + points['STREET'], points['POSTCODE'])
+    return {key: point for key, point in zip(keys, zip(points['LAT'], points['LON'])) if key is not None}
+
+class CoordinateResolver:
+    '''
+    Coordinate resolution stage that answers each address from the cheapest
+    source available, in order:
+
+        position       - Location.position sent by the carrier
+        cache          - Persistent geocode cache (see geocode_cache.GeocodeCache)
+        address_points - Offline address-point file (see load_address_points)
+        remote         - Remote geocoder, the last resort
+
+    and counts which tier answered each address
+    -----
+    Inputs:
+
+    geocode_cache (GeocodeCache) - Persistent geocode cache
+
+    geocoder (function) - Remote geocoder taking a street address and returning
+                          [latitude, longitude] ([None, None] when not found);
+                          a ValueError marks a failed lookup that is not cached
+
+    address_points (dict) - Optional offline address points (see load_address_points)
+
+    failed_coordinate (list) - Coordinate used when the remote geocoder fails
+    '''
+    def __init__(self, geocode_cache, geocoder, address_points=None, failed_coordinate=None):
+        self.geocode_cache = geocode_cache
+        self.geocoder = geocoder
+        self.address_points = address_points or {}
+        self.failed_coordinate = failed_coordinate or [None, None]
+        self.counts = Counter()
+        self.lock = threading.Lock()
+
+    def resolve(self, address, key, position=None, point_key=None):
+        '''
+        Resolve the coordinates of a single address
+        -----
+        Inputs:
+
+        address (str) - Street address as sent by the carrier
+
+        key (str) - Normalized address (see geocode_cache.geocode_key)
+
+        position (list) - Optional [latitude, longitude] from Location.position
+
+        point_key (str) - Optional address-point key (see address_parser.address_point_keys)
+        -----
+        Outputs:
+
+        coordinate (list) - [latitude, longitude]
+
+        tier (str) - Name of the tier that answered (see tiers)
+        '''
+        coordinate, tier = self.resolve_local(address, key, position, point_key)
+        if tier is not None:
+            return coordinate, tier
+        return self.resolve_remote(address, key)
+
+    def resolve_local(self, address, key, position=None, point_key=None):
+        '''
+        Resolve an address from the tiers that need no network call (see resolve)
+        -----
+        Outputs:
+
+        coordinate (list) - [latitude, longitude] or None if only the remote
+                            geocoder can answer
+
+        tier (str) - Name of the tier that answered or None
+        '''
+        if position is not None and None not in position:
+            return self.answer(list(position), 'position')
+        if key is None:
+            return self.answer([None, None], 'missing')
+        coordinate = self.geocode_cache.get(key)
+        if coordinate is not None:
+            return self.answer(coordinate, 'cache')
+        if point_key in self.address_points:
+            coordinate = list(self.address_points[point_key])
+            self.geocode_cache.set(key, coordinate)
+            return self.answer(coordinate, 'address_points')
+        return None, None
+
+    def resolve_remote(self, address, key):
+        '''
+        Resolve an address with the remote geocoder and cache the result
+        (see resolve)
+        '''
+        try:
+            coordinate = self.geocoder(address)
+        except ValueError: # Catch failed lookups (e.g. non-json replies)
+            return self.answer(list(self.failed_coordinate), 'failed')
+        self.geocode_cache.set(key, coordinate) # [None, None] is cached as a known miss
+        return self.answer(coordinate, 'remote')
+
+    def resolve_all(self, addresses, keys, positions=None, point_keys=None):
+        '''
+        Resolve a list of addresses (see resolve)
+        -----
+        Inputs:
+
+        addresses (list) - List of street addresses
+
+        keys (list) - List of normalized addresses
+
+        positions (list) - Optional list of [latitude, longitude] from Location.position
+
+        point_keys (list) - Optional list of address-point keys
+        -----
+        Output:
+
+        coordinates (list) - 2D list of coordinates [[latitude, longitude], ...]
+        '''
+        positions = positions or [None] * len(addresses)
+        point_keys = point_keys or [None] * len(addresses)
+        return [self.resolve(address, key, position, point_key)[0]
+                for address, key, position, point_key in zip(addresses, keys, positions, point_keys)]
+
+    def answer(self, coordinate, tier):
+        '''
+        Helper that counts the tier that answered
+        '''
+        with self.lock:
+            self.counts[tier] += 1
+        return coordinate, tier
+
+    def report(self):
+        '''
+        Print how many addresses each tier answered
+        '''
+        summary = ', '.join(f'{tier}: {self.counts[tier]}' for tier in tiers if self.counts[tier])
+        print(f'Coordinates resolved by tier - {summary or "none"}')
@@ -1,6 +1,7 @@
 # Import libraries
 import sys
-import requests
+from fhir_client import get_session
+from crawl_planner import count_query
 
 # Global variables
 carrier = sys.argv[1]
@@ -12,9 +13,8 @@ if carrier == 'Kaiser' or carrier == 'kaiser':
 else:
     sys.exit(f'Error: carrier name ({carrier}) not recognized')
 
+# Ask only for the total (_summary=count) instead of downloading a page of resources
 full_query = base_url + search_param
-request = requests.get(full_query)
-json_object = request.json()
-total_entries = json_object.get('total')
+total_entries = count_query(get_session(), full_query)
 
-print(f'{carrier} providers in {city}: {total_entries}')
\ No newline at end of file
+print(f'{carrier} providers in {city}: {total_entries}')
@@ -0,0 +1,212 @@
+# Import necessary libraries
+import math
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+# Define global variables
+max_pages_per_shard = 20 # Larger shards are split so no single shard dominates the crawl
+probe_workers = 8
+
+# Define necessary functions
+def count_query(session, url):
+    '''
+    Function that asks the server how many resources a search matches without
+    returning any of them (_summary=count)
+    -----
+    Inputs:
+
+    session (Session) - requests Session to use (see fhir_client)
+
+    url (str) - Search API call
+    -----
+    Output:
+
+    total (int) - Number of matching resources or None if the probe failed
+                  (e.g. the server rejected a search parameter)
+    '''
+    separator = '&' if '?' in url else '?'
+    try:
+        request = session.get(url + separator + '_summary=count')
+        json_object = request.json()
+    except (requests.exceptions.RequestException, ValueError):
+        return None
+    if not request.ok or json_object.get('resourceType') != 'Bundle':
+        return None
+    return json_object.get('total')
+
+def estimate_pages(count, page_size):
+    '''
+    Helper function that converts a result count into a number of search pages
+    '''
+    return math.ceil(count / page_size) if count else 0
+
+def city_query(query, city_param, cities):
+    '''
+    Helper function that restricts query to one or more cities; several cities
+    are OR-ed in a single comma-separated value (FHIR string search)
+    '''
+    return query + f'&{city_param}=' + ','.join(cities)
+
+def make_shard(query, city_param, level, label, cities, count, page_size):
+    '''
+    Helper function that describes a single shard of a crawl plan
+    '''
+    url = query if level == 'state' else city_query(query, city_param, cities)
+    return {'url': url,
+            'level': level,
+            'label': label,
+            'cities': list(cities),
+            'count': count,
+            'pages': estimate_pages(count, page_size)}
+
+def pack_cities(city_counts, page_size, max_pages):
+    '''
+    Function that groups cities into as few shards as possible with at most
+    max_pages pages each (first-fit decreasing); a city larger than max_pages
+    gets a shard of its own
+    -----
+    Inputs:
+
+    city_counts (dict) - Dictionary mapping city names to result counts (> 0)
+
+    page_size (int) - Number of results per page (_count)
+
+    max_pages (int) - Page budget per shard
+    -----
+    Output:
+
+    groups (list) - List of (cities, count) tuples
+    '''
+    groups = []
+    for city, count in sorted(city_counts.items(), key=lambda item: -item[1]):
+        for group in groups:
+            if estimate_pages(group[1] + count, page_size) <= max_pages:
+                group[0].append(city)
+                group[1] += count
+                break
+        else:
+            groups.append([[city], count])
+    return [(cities, count) for cities, count in groups]
+
+def plan_shards(session, query, city_param, regions, page_size=100,
+                max_pages=max_pages_per_shard, allow_state=True):
+    '''
+    Function that uses cheap _summary=count probes to choose the query
+    granularity of a crawl and returns the smallest set of shards covering
+    every city in regions:
+
+        state  - one statewide query, when it costs no more pages than the
+                 regions combined (caller filters out other cities)
+        region - one query per region (cities OR-ed together)
+        city   - regions that are too large are probed city by city; empty
+                 cities are dropped and the rest are packed into shards of at
+                 most max_pages pages
+
+    Region counts are only trusted once per-city probes of one region confirm
+    that the server ORs comma-separated values; otherwise every city is probed
+    and crawled on its own. A statewide count of 0 yields no shards at all.
+    -----
+    Inputs:
+
+    session (Session) - requests Session to use (see fhir_client)
+
+    query (str) - Search API call with every fixed parameter, including the
+                  state and _count (e.g. base + 'Location?address-state=CA&_count=100')
+
+    city_param (str) - Search parameter holding the city
+                       (e.g. 'address-city' or 'location.address-city')
+
+    regions (dict) - Dictionary mapping region names to lists of cities
+                     (e.g. {'East Bay': east_bay, ...} from cities.py)
+
+    page_size (int) - Number of results per page (_count)
+
+    max_pages (int) - Page budget per shard
+
+    allow_state (bool) - Whether a statewide query may be chosen
+    -----
+    Output:
+
+    shards (list) - List of shard dictionaries with keys url, level, label,
+                    cities, count and pages (estimated search pages)
+    '''
+    with ThreadPoolExecutor(max_workers=probe_workers) as executor:
+        region_names = list(regions)
+        city_counts = {} # Region name -> per-city counts, probed at most once
+
+        def probe_cities(name):
+            if name not in city_counts:
+                city_counts[name] = list(executor.map(lambda city: count_query(session, city_query(query, city_param, [city])),
+                                                      regions[name]))
+            return city_counts[name]
+
+        region_counts = list(executor.map(lambda name: count_query(session, city_query(query, city_param, regions[name])),
+                                          region_names))
+        state_count = count_query(session, query) if allow_state else None
+
+        # A server that reads the comma list as one literal city answers 0
+        # without an error, so confirm OR support against per-city probes of
+        # the first region that has any results before trusting region counts
+        or_supported = False
+        for name, count in zip(region_names, region_counts):
+            counts = [city_count for city_count in probe_cities(name) if city_count is not None]
+            if not any(counts):
+                continue
+            or_supported = count is not None and count >= max(counts)
+            break
+        if not or_supported:
+            print(f'Server OR-ing of comma-separated {city_param} values not confirmed, planning city by city')
+            region_counts = [None] * len(region_names)
+            for name in region_names:
+                probe_cities(name)
+        probes = len(region_names) + (1 if allow_state else 0) + sum(len(counts) for counts in city_counts.values())
+
+        if state_count == 0: # Nothing anywhere in the state
+            print_plan(query, [], probes)
+            return []
+        if or_supported:
+            target_pages = sum(estimate_pages(count or 0, page_size) for count in region_counts)
+            known = None not in region_counts
+        else:
+            target_pages = sum(estimate_pages(count or 0, page_size)
+                               for counts in city_counts.values() for count in counts)
+            known = all(None not in counts for counts in city_counts.values())
+        all_cities = [city for name in region_names for city in regions[name]]
+        if state_count is not None and known and estimate_pages(state_count, page_size) <= target_pages:
+            shards = [make_shard(query, city_param, 'state', 'CA', all_cities, state_count, page_size)]
+            print_plan(query, shards, probes)
+            return shards
+
+        shards = []
+        for name, count in zip(region_names, region_counts):
+            if count == 0:
+                continue
+            if count is not None and estimate_pages(count, page_size) <= max_pages:
+                shards.append(make_shard(query, city_param, 'region', name, regions[name], count, page_size))
+                continue
+            # Region too large (or OR not supported): use its per-city counts
+            cities = regions[name]
+            counts = probe_cities(name)
+            nonempty = {city: city_count for city, city_count in zip(cities, counts) if city_count}
+            unknown = [city for city, city_count in zip(cities, counts) if city_count is None]
+            if or_supported:
+                groups = pack_cities(nonempty, page_size, max_pages)
+            else: # One shard per city
+                groups = [([city], city_count) for city, city_count in nonempty.items()]
+            for group_cities, group_count in groups:
+                shards.append(make_shard(query, city_param, 'city', ', '.join(group_cities),
+                                         group_cities, group_count, page_size))
+            for city in unknown: # Probe failed: crawl anyway with an unknown estimate
+                shards.append(make_shard(query, city_param, 'city', city, [city], None, page_size))
+        probes = len(region_names) + (1 if allow_state else 0) + sum(len(counts) for counts in city_counts.values())
+    print_plan(query, shards, probes)
+    return shards
+
+def print_plan(query, shards, probes):
+    '''
+    Helper function that prints a one-line summary of a crawl plan
+    '''
+    pages = sum(shard['pages'] or 0 for shard in shards)
+    levels = sorted(set(shard['level'] for shard in shards))
+    print(f'Plan for {query}: {len(shards)} shard(s) at {"/".join(levels) or "-"} level, '
+          f'~{pages} page(s), {probes} count probe(s)')
@@ -0,0 +1,92 @@
+# Import necessary libraries
+import json
+import os
+
+# Define necessary functions
+def load_checkpoint(path):
+    '''
+    Function that reads a crawl checkpoint written by save_checkpoint
+    -----
+    Input:
+
+    path (str) - Path of the checkpoint file
+    -----
+    Output:
+
+    checkpoint (dict) - Dictionary with keys next_url, page_number and row_count
+                        or None if no checkpoint exists
+    '''
+    try:
+        with open(path, 'r') as checkpoint_file:
+            return json.load(checkpoint_file)
+    except FileNotFoundError:
+        return None
+    except json.decoder.JSONDecodeError: # Catch checkpoint truncated by a crash
+        print(f'Ignoring unreadable checkpoint {path}')
+        return None
+
+def save_checkpoint(path, next_url, page_number, row_count):
+    '''
+    Function that records the crawl position after a page has been written.
+    The file is replaced atomically so a crash mid-write never leaves a
+    partial checkpoint behind.
+    -----
+    Inputs:
+
+    path (str) - Path of the checkpoint file
+
+    next_url (str) - Next-page link still to be fetched (None once the crawl
+                     has reached the last page)
+
+    page_number (int) - Number of pages written so far
+
+    row_count (int) - Number of rows written so far
+    '''
+    checkpoint = {'next_url': next_url,
+                  'page_number': page_number,
+                  'row_count': row_count}
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as checkpoint_file:
+        json.dump(checkpoint, checkpoint_file)
+        checkpoint_file.flush()
+        os.fsync(checkpoint_file.fileno())
+    os.replace(temp_path, path)
+
+def load_watermark(path, key):
+    '''
+    Function that reads the sync watermark recorded for key by save_watermark
+    -----
+    Inputs:
+
+    path (str) - Path of the watermark file
+
+    key (str) - Sync scope (e.g. carrier and city)
+    -----
+    Output:
+
+    watermark (str) - Recorded FHIR instant or None if key was never synced
+    '''
+    watermarks = load_checkpoint(path) or {}
+    return watermarks.get(key)
+
+def save_watermark(path, key, watermark):
+    '''
+    Function that records the sync watermark of key, leaving the other keys
+    in the file untouched; the file is replaced atomically (see save_checkpoint)
+    -----
+    Inputs:
+
+    path (str) - Path of the watermark file
+
+    key (str) - Sync scope (e.g. carrier and city)
+
+    watermark (str) - FHIR instant to resume the next incremental sync from
+    '''
+    watermarks = load_checkpoint(path) or {}
+    watermarks[key] = watermark
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w') as watermark_file:
+        json.dump(watermarks, watermark_file, indent=1, sort_keys=True)
+        watermark_file.flush()
+        os.fsync(watermark_file.fileno())
+    os.replace(temp_path, path)
@@ -0,0 +1,53 @@
+# Import necessary libraries
+import numpy as np
+
+# Define global variables
+earth_radius_km = 6371.0088 # Mean Earth radius
+
+# Define necessary functions
+def haversine(lat1, lon1, lat2, lon2):
+    '''
+    Function that computes great-circle distances with the haversine formula.
+    Inputs are NumPy arrays (or scalars) in degrees and broadcast against each
+    other, e.g. an (M, 1) column of query points against an (N,) row of
+    providers gives an (M, N) distance matrix.
+    -----
+    Inputs:
+
+    lat1, lon1 (array) - Latitudes and longitudes of the first points
+
+    lat2, lon2 (array) - Latitudes and longitudes of the second points
+    -----
+    Output:
+
+    distances (array) - Distances in kilometers
+    -----
+    Example:
+
+    >>> round(float(haversine(37.8716, -122.2727, 37.8044, -122.2712)), 2)
+    7.47
+    '''
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(value, dtype=float))
+                              for value in (lat1, lon1, lat2, lon2))
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * earth_radius_km * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def valid_coordinates(latitudes, longitudes):
+    '''
+    Helper function that flags usable coordinates; missing values and the
+    placeholder coordinates written for failed geocodes (e.g. 100.0, 200.0)
+    are invalid
+    -----
+    Inputs:
+
+    latitudes, longitudes (array) - Coordinates in degrees (NaN when missing)
+    -----
+    Output:
+
+    valid (array) - Boolean array
+    '''
+    latitudes = np.asarray(latitudes, dtype=float)
+    longitudes = np.asarray(longitudes, dtype=float)
+    return (np.isfinite(latitudes) & np.isfinite(longitudes)
+            & (np.abs(latitudes) <= 90) & (np.abs(longitudes) <= 180))
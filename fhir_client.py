@@ -0,0 +1,77 @@
+# Import necessary libraries
+import os
+import threading
+from requests.packages.urllib3.util.retry import Retry
+from http_cache import HTTPCache, CachingHTTPAdapter
+from rate_limit import RateLimiter, RateLimitedSession
+
+# Define global variables (override with environment variables of the same name)
+cache_path = os.environ.get('FHIR_HTTP_CACHE', 'http_cache.sqlite')
+cache_ttl = float(os.environ.get('FHIR_HTTP_CACHE_TTL', 7 * 86400)) # Seconds a cached response stays usable
+pool_size = int(os.environ.get('FHIR_POOL_SIZE', 32)) # Kept-alive connections per host
+connect_retries = int(os.environ.get('FHIR_CONNECT_RETRIES', 5))
+read_retries = int(os.environ.get('FHIR_READ_RETRIES', 2))
+backoff_factor = float(os.environ.get('FHIR_BACKOFF_FACTOR', 2))
+start_rate = os.environ.get('FHIR_START_RATE') # Requests/s per host before any throttling (unset: unthrottled)
+start_rate = float(start_rate) if start_rate else None
+max_rate = float(os.environ.get('FHIR_MAX_RATE', 100)) # Highest adaptive rate per host after throttling
+host_limits = {'nominatim.openstreetmap.org': {'rate': 1.0, 'max_rate': 1.0}} # Usage policy: 1 req/s
+shared_session = None
+session_lock = threading.Lock()
+
+# Define necessary functions
+def create_session(path=cache_path, pool_size=pool_size, connect_retries=connect_retries,
+                   read_retries=read_retries, backoff_factor=backoff_factor, cache_ttl=cache_ttl):
+    '''
+    Function that creates a pooled keep-alive requests Session with connection
+    retries, per-host rate limiting with Retry-After handling (see rate_limit)
+    and a persistent conditional-GET cache (see http_cache)
+    -----
+    Inputs:
+
+    path (str) - Path of the sqlite file holding cached responses
+
+    pool_size (int) - Number of connections kept alive per host; should be at
+                      least the number of concurrent requests per host
+                      (see async_fetch.max_per_host)
+
+    connect_retries (int) - Retries of failed connections
+
+    read_retries (int) - Retries of idempotent requests whose response failed
+                         mid-read
+
+    backoff_factor (float) - Base delay in seconds between urllib3 retries
+
+    cache_ttl (float) - Number of seconds a cached response stays usable
+    -----
+    Output:
+
+    session (Session) - Configured requests Session
+    '''
+    session = RateLimitedSession(RateLimiter(host_limits=host_limits, rate=start_rate, max_rate=max_rate))
+    session.headers['Connection'] = 'keep-alive'
+    # 429/503 and Retry-After are handled by RateLimitedSession, not urllib3
+    retry = Retry(connect=connect_retries, read=read_retries, backoff_factor=backoff_factor,
+                  respect_retry_after_header=False)
+    adapter = CachingHTTPAdapter(HTTPCache(path, ttl=cache_ttl),
+                                 pool_connections=pool_size,
+                                 pool_maxsize=pool_size,
+                                 max_retries=retry)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+def get_session():
+    '''
+    Function that returns the Session shared by every script and helper
+    module, creating it on first use
+    -----
+    Output:
+
+    session (Session) - Shared requests Session (see create_session)
+    '''
+    global shared_session
+    with session_lock:
+        if shared_session is None:
+            shared_session = create_session()
+    return shared_session
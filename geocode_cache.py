@@ -0,0 +1,117 @@
+# Import necessary libraries
+import re
+import sqlite3
+import threading
+import time
+
+# Define global variables
+whitespace = re.compile(r'(?:\s|%20)+')
+
+# Define necessary functions
+def geocode_key(cleaned_address):
+    '''
+    Function that normalizes a cleaned street address (see
+    provider_script.clean_address) into a geocode cache key, so that spacing
+    and letter case differences share one entry
+    -----
+    Input:
+
+    cleaned_address (str) - Street address with unit removed ('%20' or spaces)
+    -----
+    Output:
+
+    key (str) - Normalized address or None if cleaned_address is missing
+    -----
+    Example:
+
+    >>> geocode_key('5601%20Arnold%20Rd%20Dublin%20CA%2094568')
+    '5601 arnold rd dublin ca 94568'
+    '''
+    if not isinstance(cleaned_address, str):
+        return None
+    key = whitespace.sub(' ', cleaned_address).strip().lower()
+    return key or None
+
+class GeocodeCache:
+    '''
+    Persistent sqlite cache of geocoding results keyed by geocode_key. Both
+    found coordinates and known misses (addresses the geocoder could not find)
+    are stored, so neither is looked up again; misses expire after miss_ttl
+    seconds so they are eventually retried.
+    -----
+    Inputs:
+
+    path (str) - Path of the sqlite file holding geocodes
+
+    miss_ttl (int) - Number of seconds a known miss stays valid
+    '''
+    def __init__(self, path='geocode_cache.sqlite', miss_ttl=30 * 24 * 60 * 60):
+        self.miss_ttl = miss_ttl
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS geocodes ('
+                          'key TEXT PRIMARY KEY, '
+                          'latitude TEXT, '
+                          'longitude TEXT, '
+                          'stored REAL NOT NULL)')
+        self.conn.commit()
+        self.hits = 0
+        self.miss_hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        '''
+        Look up a normalized address
+        -----
+        Input:
+
+        key (str) - Normalized address (see geocode_key)
+        -----
+        Output:
+
+        coordinate (list) - [latitude, longitude] as strings, [None, None] for a
+                            known miss, or None if the address is not cached
+        '''
+        if key is None:
+            return None
+        with self.lock:
+            row = self.conn.execute('SELECT latitude, longitude, stored FROM geocodes WHERE key = ?',
+                                    (key,)).fetchone()
+            if row is None or (row[0] is None and time.time() - row[2] >= self.miss_ttl):
+                self.misses += 1
+                return None
+            if row[0] is None:
+                self.miss_hits += 1
+            else:
+                self.hits += 1
+            return [row[0], row[1]]
+
+    def set(self, key, coordinate):
+        '''
+        Store a geocoding result
+        -----
+        Inputs:
+
+        key (str) - Normalized address (see geocode_key)
+
+        coordinate (list) - [latitude, longitude]; [None, None] records a miss
+        '''
+        if key is None:
+            return
+        latitude, longitude = coordinate
+        with self.lock:
+            self.conn.execute('INSERT OR REPLACE INTO geocodes VALUES (?, ?, ?, ?)',
+                              (key, latitude, longitude, time.time()))
+            self.conn.commit()
+
+    def close(self):
+        '''
+        Close the cache and print hit/miss counts
+        '''
+        lookups = self.hits + self.miss_hits + self.misses
+        rate = (self.hits + self.miss_hits) / lookups if lookups else 0.0
+        print(f'Geocode cache: {self.hits} hit(s), {self.miss_hits} known miss(es), '
+              f'{self.misses} lookup(s) sent to the geocoder ({rate:.0%} hit rate)')
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
@@ -0,0 +1,98 @@
+# Import necessary libraries
+import queue
+import threading
+
+class GeocodeQueue:
+    '''
+    Background geocoding stage. Addresses are submitted while the crawl runs,
+    duplicates (by normalized address) are dropped, and worker threads resolve
+    the rest so that crawling never waits on the geocoder. Pacing comes from the
+    shared session's per-host rate limiter (see fhir_client.host_limits), so one
+    worker suits the public Nominatim service (1 req/s) and several workers
+    suit a self-hosted instance.
+    -----
+    Inputs:
+
+    geocode (function) - Function taking (address, key) and returning a
+                         [latitude, longitude] coordinate
+                         (e.g. CoordinateResolver.resolve_remote)
+
+    workers (int) - Number of worker threads
+    -----
+    Example:
+
+    >>> geocode_queue = GeocodeQueue(lambda address, key: resolver.resolve_remote(address, key)[0])
+    >>> geocode_queue.submit('5601 Arnold Rd Dublin CA 94568', key)
+    >>> coordinates = geocode_queue.join() # {key: [latitude, longitude]}
+    '''
+    def __init__(self, geocode, workers=1):
+        self.geocode = geocode
+        self.tasks = queue.Queue()
+        self.results = {}
+        self.submitted = set()
+        self.lock = threading.Lock()
+        self.threads = [threading.Thread(target=self.work, daemon=True)
+                        for _ in range(max(1, workers))]
+        for thread in self.threads:
+            thread.start()
+
+    def submit(self, address, key):
+        '''
+        Queue an address for geocoding unless the same key was already queued
+        -----
+        Inputs:
+
+        address (str) - Street address passed to the geocoder
+
+        key (str) - Normalized address the result is stored under
+        '''
+        if key is None:
+            return
+        with self.lock:
+            if key in self.submitted:
+                return
+            self.submitted.add(key)
+        self.tasks.put((address, key))
+
+    def work(self):
+        '''
+        Worker loop that geocodes queued addresses until it receives None
+        '''
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                self.tasks.task_done()
+                return
+            address, key = task
+            try:
+                coordinate = self.geocode(address, key)
+            except Exception as error: # Keep the worker alive; the row keeps empty coordinates
+                print(f'Geocoding failed for {address}: {error}')
+                coordinate = [None, None]
+            with self.lock:
+                self.results[key] = coordinate
+            self.tasks.task_done()
+
+    def pending(self):
+        '''
+        Return the number of addresses not yet geocoded
+        '''
+        with self.lock:
+            return len(self.submitted) - len(self.results)
+
+    def join(self):
+        '''
+        Wait for every queued address, stop the workers and return the results
+        -----
+        Output:
+
+        results (dict) - Dictionary mapping keys to [latitude, longitude]
+        '''
+        if self.pending():
+            print(f'Waiting for {self.pending()} address(es) to geocode...')
+        for _ in self.threads:
+            self.tasks.put(None)
+        self.tasks.join()
+        for thread in self.threads:
+            thread.join()
+        return dict(self.results)
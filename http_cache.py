@@ -0,0 +1,207 @@
+# Import necessary libraries
+import sqlite3
+import tempfile
+import threading
+import time
+from urllib.parse import urlsplit, parse_qsl
+from requests.adapters import HTTPAdapter
+
+# Define global variables
+spool_size = 1024 * 1024 # Streamed bodies larger than this are spooled to disk before caching
+blob_chunk_size = 64 * 1024
+cursor_params = ('_getpages',) # Paging cursors expire on the server and are never requested twice
+
+class HTTPCache:
+    '''
+    Persistent store of GET response bodies and their validators (ETag and
+    Last-Modified) keyed by full request URL. Entries older than ttl seconds
+    are ignored and pruned from the file when it is opened.
+    -----
+    Inputs:
+
+    path (str) - Path of the sqlite file holding cached responses
+
+    ttl (int) - Number of seconds a stored response stays usable
+    '''
+    def __init__(self, path='http_cache.sqlite', ttl=7 * 86400):
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('CREATE TABLE IF NOT EXISTS responses ('
+                          'url TEXT PRIMARY KEY, '
+                          'etag TEXT, '
+                          'last_modified TEXT, '
+                          'content_type TEXT, '
+                          'body BLOB NOT NULL, '
+                          'stored REAL NOT NULL)')
+        self.conn.commit()
+        self.revalidated = 0
+        self.stored = 0
+        self.pruned = self.prune()
+
+    def prune(self):
+        '''
+        Delete every expired response
+        -----
+        Output:
+
+        pruned (int) - Number of responses deleted
+        '''
+        with self.lock:
+            cursor = self.conn.execute('DELETE FROM responses WHERE stored < ?', (time.time() - self.ttl,))
+            self.conn.commit()
+            return cursor.rowcount
+
+    def get(self, url):
+        '''
+        Look up the cached response for url
+        -----
+        Input:
+
+        url (str) - Full request URL
+        -----
+        Output:
+
+        entry (tuple) - (etag, last_modified, content_type, body) or None if
+                        url is not cached or its entry has expired
+        '''
+        with self.lock:
+            return self.conn.execute('SELECT etag, last_modified, content_type, body '
+                                     'FROM responses WHERE url = ? AND stored >= ?',
+                                     (url, time.time() - self.ttl)).fetchone()
+
+    def set(self, url, etag, last_modified, content_type, body):
+        '''
+        Store a response body together with its validators
+        '''
+        with self.lock:
+            self.conn.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)',
+                              (url, etag, last_modified, content_type, body, time.time()))
+            self.conn.commit()
+            self.stored += 1
+
+    def touch(self, url, etag=None, last_modified=None):
+        '''
+        Mark the response for url as fresh after the server confirmed it
+        (304 Not Modified), taking any new validators sent with the 304
+        '''
+        with self.lock:
+            self.conn.execute('UPDATE responses SET stored = ?, '
+                              'etag = COALESCE(?, etag), '
+                              'last_modified = COALESCE(?, last_modified) '
+                              'WHERE url = ?',
+                              (time.time(), etag, last_modified, url))
+            self.conn.commit()
+
+    def set_file(self, url, etag, last_modified, content_type, body_file, size):
+        '''
+        Store a response body read from a file object, copying it into the
+        database in chunks so the whole body is never held in memory
+        -----
+        Inputs:
+
+        url, etag, last_modified, content_type - See set
+
+        body_file (file) - Binary file object positioned at the start of the body
+
+        size (int) - Body length in bytes
+        '''
+        with self.lock:
+            if not hasattr(self.conn, 'blobopen'): # Incremental blob I/O needs Python 3.11+
+                self.conn.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)',
+                                  (url, etag, last_modified, content_type, body_file.read(), time.time()))
+            else:
+                cursor = self.conn.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, zeroblob(?), ?)',
+                                           (url, etag, last_modified, content_type, size, time.time()))
+                with self.conn.blobopen('responses', 'body', cursor.lastrowid) as blob:
+                    for chunk in iter(lambda: body_file.read(blob_chunk_size), b''):
+                        blob.write(chunk)
+            self.conn.commit()
+            self.stored += 1
+
+def is_cursor(url):
+    '''
+    Helper function that checks whether url is a server-side paging cursor
+    (e.g. HAPI's ?_getpages=...), which is not worth caching
+    '''
+    return any(name in cursor_params for name, value in parse_qsl(urlsplit(url).query))
+
+class CachingHTTPAdapter(HTTPAdapter):
+    '''
+    Transport adapter that turns every GET into a conditional GET when a
+    cached copy exists (If-None-Match / If-Modified-Since) and serves the
+    cached body when the server answers 304 Not Modified. Requests sent with
+    Cache-Control: no-store (e.g. bulk NDJSON downloads) and paging cursor
+    URLs (see cursor_params) bypass the cache.
+    Streamed responses (stream=True) are copied into the cache as the caller
+    reads them, so incremental parsing still overlaps the transfer; a body
+    that is not read to the end is not cached.
+    -----
+    Inputs:
+
+    cache (HTTPCache) - Store of cached responses
+
+    **kwargs - Passed through to requests.adapters.HTTPAdapter
+    '''
+    def __init__(self, cache, **kwargs):
+        self.cache = cache
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if (request.method != 'GET' or 'no-store' in request.headers.get('Cache-Control', '')
+                or is_cursor(request.url)):
+            return super().send(request, **kwargs)
+        entry = self.cache.get(request.url)
+        if entry is not None:
+            etag, last_modified, content_type, body = entry
+            if etag:
+                request.headers['If-None-Match'] = etag
+            if last_modified:
+                request.headers['If-Modified-Since'] = last_modified
+        response = super().send(request, **kwargs)
+        if response.status_code == 304 and entry is not None:
+            self.cache.touch(request.url, response.headers.get('ETag'), response.headers.get('Last-Modified'))
+            response.close()
+            response.status_code = 200
+            response.reason = 'OK'
+            response._content = body
+            response._content_consumed = True
+            if content_type:
+                response.headers['Content-Type'] = content_type
+            response.from_cache = True
+            self.cache.revalidated += 1
+            return response
+        response.from_cache = False
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if response.status_code == 200 and (etag or last_modified):
+            if kwargs.get('stream'):
+                self.store_when_read(request.url, response, etag, last_modified)
+            else:
+                self.cache.set(request.url, etag, last_modified,
+                               response.headers.get('Content-Type'), response.content)
+        return response
+
+    def store_when_read(self, url, response, etag, last_modified):
+        '''
+        Helper that wraps a streamed response's iter_content so every chunk
+        the caller reads is also spooled, and the body is cached once it has
+        been read to the end
+        '''
+        iter_content = response.iter_content
+        cache = self.cache
+        content_type = response.headers.get('Content-Type')
+
+        def iter_and_store(chunk_size=1, decode_unicode=False):
+            if decode_unicode: # Decoded text is not the stored body
+                yield from iter_content(chunk_size=chunk_size, decode_unicode=True)
+                return
+            with tempfile.SpooledTemporaryFile(max_size=spool_size) as spool:
+                for chunk in iter_content(chunk_size=chunk_size):
+                    spool.write(chunk)
+                    yield chunk
+                size = spool.tell()
+                spool.seek(0)
+                cache.set_file(url, etag, last_modified, content_type, spool, size)
+
+        response.iter_content = iter_and_store
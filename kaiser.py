@@ -1,8 +1,12 @@
-import requests
-import pandas as pd
+from fhir_client import get_session
 import numpy as np
 from cities import *
 from specialties import *
+from shard_scheduler import run_shards
+from columnar import RecordBuilder
+from paginate import iter_pages
+from crawl_planner import plan_shards
+from seen_set import SeenSet
 
 # KP API variables
 base = 'https://kpx-service-bus.kp.org/service/hp/mhpo/healthplanproviderv1rc/'
@@ -12,148 +16,170 @@ org = 'Organization'
 dr = 'Practitioner'
 role = 'PractitionerRole'
 
+session = get_session()
+seen = SeenSet() # Resources already collected by any shard
+
 # Bay Area cities
 bay_area = np.array([east_bay])
 bay_area = np.append(bay_area, south_bay).flatten()
 bay_area = np.append(bay_area, peninsula).flatten()
 bay_area = np.append(bay_area, north_bay).flatten()
 
+# Regions searched as a unit by the crawl planner
+regions = {'East Bay': east_bay,
+           'South Bay': south_bay,
+           'Peninsula': peninsula,
+           'North Bay': north_bay}
+
+# Shard helpers
+def shard_url(shard):
+    '''
+    Function that returns the first search API call for a crawl shard
+    -----
+    Input:
+
+    shard (dict) - Shard from crawl_planner.plan_shards
+    -----
+    Output:
+
+    url (str) - Search API call for the shard's first page
+    '''
+    return shard['url']
+
+# Columns extracted from each resource type
+loc_columns = {'id': 'string',
+               'name': 'string',
+               'address': 'string',
+               'city': 'string',
+               'zip': 'string',
+               'status': 'string'}
+hcs_columns = {'id': 'string',
+               'location': 'string',
+               'name': 'string',
+               'specialty': 'string',
+               'status': 'boolean',
+               'phone': 'string',
+               'language': 'object'}
+
+def location_record(resource):
+    '''
+    Function that extracts the Location DataFrame fields from a Location resource
+    -----
+    Input:
+
+    resource (dict) - Location resource
+    -----
+    Output:
+
+    record (dict) - Dictionary with one value per column of loc_columns
+    '''
+    return {'id': resource['id'],
+            'name': resource['identifier'][0]['value'],
+            'address': resource['address']['text'],
+            'city': resource['address']['city'],
+            'zip': resource['address']['postalCode'],
+            'status': resource['status']}
+
+def service_record(resource):
+    '''
+    Function that extracts the Providers DataFrame fields from a
+    HealthcareService resource
+    -----
+    Input:
+
+    resource (dict) - HealthcareService resource
+    -----
+    Output:
+
+    record (dict) - Dictionary with one value per column of hcs_columns
+    '''
+    try:
+        specialty = resource['specialty'][0]['coding'][0]['display']
+    except KeyError:
+        specialty = 'N/A'
+    return {'id': resource['id'],
+            'location': resource['location'][0]['reference'][9:],
+            'name': resource['name'],
+            'specialty': specialty,
+            'status': resource['active'],
+            'phone': resource['telecom'][0]['value'],
+            'language': resource['language']}
+
+def crawl_shard(shard):
+    '''
+    Function that pages through a single shard's search results and extracts
+    the fields of each resource on the worker, so only those fields (not the
+    raw resources) are kept until every shard has finished
+    -----
+    Input:
+
+    shard (dict) - Shard from crawl_planner.plan_shards, with the resource
+                   type searched added under 'resource'
+    -----
+    Output:
+
+    records (RecordBuilder) - Extracted fields of every resource in the shard,
+                              without resources another shard already collected
+    '''
+    if shard['resource'] == loc:
+        records, extract = RecordBuilder(loc_columns), location_record
+    else:
+        records, extract = RecordBuilder(hcs_columns), service_record
+    # Pages are prefetched in parallel when next links are predictable (see paginate);
+    # shards without resources return a single empty page
+    for bundle in iter_pages(session, shard_url(shard)):
+        for entry in bundle.entries():
+            if seen.claim_entry(entry):
+                records.append(**extract(entry['resource']))
+    return records
+
+# Plan shards with _summary=count probes: empty cities are dropped and the
+# cheapest granularity (statewide, region or packed cities) is chosen per search
+loc_shards = plan_shards(session, base + loc + '?address-state=CA&_count=100', 'address-city', regions)
+hcs_shards = [shard for specialty in mental_health
+              for shard in plan_shards(session,
+                                       base + hcs + f'?location.address-state=CA&specialty={specialty}&_count=100',
+                                       'location.address-city', regions)]
+for shard in loc_shards:
+    shard['resource'] = loc
+for shard in hcs_shards:
+    shard['resource'] = hcs
+statewide_loc = any(shard['level'] == 'state' for shard in loc_shards)
+statewide_hcs = any(shard['level'] == 'state' for shard in hcs_shards)
+
+# Crawl every planned shard in one parallel work queue
+shard_results = run_shards(loc_shards + hcs_shards, crawl_shard, shard_url)
+loc_results = shard_results[:len(loc_shards)]
+hcs_results = shard_results[len(loc_shards):]
+seen.report()
+
 ### Location DataFrame ###
 
-# Initialize arrays to hold information
-loc_refs = np.array([])
-loc_names = np.array([])
-loc_addresses = np.array([])
-loc_cities = np.array([])
-loc_zips = np.array([])
-loc_statuses = np.array([])
-
-# Fill arrays
-for city in bay_area:
-    city_loc_bundle = requests.get(base + loc + f'?address-city={city}&address-state=CA&_count=100').json()
-    
-    # Check if city has any Location resources
-    if not city_loc_bundle['total']:
-        continue
-    else: 
-        # Create useful variables
-        total_items = city_loc_bundle['total']
-        total_iterations = (total_items // 100) + 1
-        obj = city_loc_bundle['entry']
-        iteration = 1
-
-        # While loop for pagination
-        while iteration <= total_iterations:
-            # Check if no pagination required
-            if total_items <= 100:
-                next_url = None
-            else:
-                next_url = city_loc_bundle['link'][1]['url']
-            for item in obj:
-                resource = item['resource']
-                # Find values in Location resource item
-                ref = resource['id']
-                name = resource['identifier'][0]['value']
-                address = resource['address']['text']
-                city_name = resource['address']['city']
-                zip_code = resource['address']['postalCode']
-                status = resource['status']
-
-                # Append to array
-                loc_refs = np.append(loc_refs, ref)
-                loc_names = np.append(loc_names, name)
-                loc_addresses = np.append(loc_addresses, address)
-                loc_cities = np.append(loc_cities, city_name)
-                loc_zips = np.append(loc_zips, zip_code)
-                loc_statuses = np.append(loc_statuses, status)
-
-            # Finished with items in obj; reinitialize variables
-            if total_items > 100:
-                city_loc_bundle = requests.get(next_url).json()
-                obj = city_loc_bundle['entry']
-            iteration += 1
+# Combine the fields extracted by each shard
+loc_records = RecordBuilder(loc_columns)
+for shard_records in loc_results:
+    loc_records.extend(shard_records)
 
 # Create Location DataFrame
-loc_df = pd.DataFrame(data={'id':loc_refs,
-                            'name':loc_names,
-                            'address':loc_addresses,
-                            'city':loc_cities,
-                            'zip':loc_zips,
-                            'status':loc_statuses})
+loc_df = loc_records.to_frame()
+if statewide_loc: # Statewide shards also return cities outside the Bay Area
+    bay_area_names = set(city.strip().casefold() for city in bay_area) # City searches ignore case
+    loc_df = loc_df[loc_df['city'].str.strip().str.casefold().isin(bay_area_names)].reset_index(drop=True)
 
 # Print status
 print('Finished with Location DataFrame, moving on to Providers')
 
 ### Providers DataFrame ###
 
-# Initialize arrays to hold information
-hcs_refs = np.array([])
-hcs_loc_refs = np.array([])
-hcs_names = np.array([])
-hcs_specialties = np.array([])
-hcs_statuses = np.array([])
-hcs_phones = np.array([])
-hcs_languages = np.array([])
-
-# Fill arrays
-for city in bay_area:
-    for specialty in mental_health: # For loop to loop through specialties
-        city_hcs_bundle = requests.get(base + hcs + f'?location.address-city={city}&location.address-state=CA&specialty={specialty}&_count=100').json()
-
-        # Check if city has any HealthcareService resources
-        if not city_hcs_bundle['total']:
-            continue
-        else:
-            # Create useful variables
-            total_items = city_hcs_bundle['total']
-            total_iterations = (total_items // 100) + 1
-            obj = city_hcs_bundle['entry']
-            iteration = 1
-
-            # For loop
-            while iteration <= total_iterations:
-                # Check if no pagination required
-                if total_items <= 100:
-                    next_url = None
-                else:
-                    next_url = city_hcs_bundle['link'][1]['url']
-                for item in obj:
-                    resource = item['resource']
-                    # Find values in HealthcareService resource item
-                    ref = resource['id']
-                    loc_ref = resource['location'][0]['reference'][9:]
-                    name = resource['name']
-                    try:
-                        specialty = resource['specialty'][0]['coding'][0]['display']
-                    except KeyError:
-                        specialty = 'N/A'
-                    status = resource['active']
-                    phone = resource['telecom'][0]['value']
-                    language = resource['language']
-
-                    # Append to array
-                    hcs_refs = np.append(hcs_refs, ref)
-                    hcs_loc_refs = np.append(hcs_loc_refs, loc_ref)
-                    hcs_names = np.append(hcs_names, name)
-                    hcs_specialties = np.append(hcs_specialties, specialty)
-                    hcs_statuses = np.append(hcs_statuses, status)
-                    hcs_phones = np.append(hcs_phones, phone)
-                    hcs_languages = np.append(hcs_languages, language)
-
-                # Finished with items in obj; reinitialize variables
-                if total_items > 100:
-                    city_hcs_bundle = requests.get(next_url).json()
-                    obj = city_hcs_bundle['entry']
-                iteration += 1
+# Combine the fields extracted by each shard
+hcs_records = RecordBuilder(hcs_columns)
+for shard_records in hcs_results:
+    hcs_records.extend(shard_records)
 
 # Create Providers DataFrame
-providers_df = pd.DataFrame(data={'id':hcs_refs,
-                                  'location':hcs_loc_refs,
-                                  'name':hcs_names,
-                                  'specialty':hcs_specialties,
-                                  'status':hcs_statuses,
-                                  'phone':hcs_phones,
-                                  'language':hcs_languages})
+providers_df = hcs_records.to_frame()
+if statewide_hcs: # Keep only providers at Bay Area locations
+    providers_df = providers_df[providers_df['location'].isin(loc_df['id'])].reset_index(drop=True)
 
 # Print status
 print('Finished with Providers DataFrame, moving on to merging')
@@ -0,0 +1,220 @@
+# Import necessary libraries
+import glob
+import json
+import os
+import pandas as pd
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError: # pyarrow is optional; without it only CSV output is available
+    pa = None
+    pq = None
+
+# Define global variables
+overflow_column = 'overflow' # CSV column holding fields first seen after the header was written
+
+# Define necessary functions
+def to_text(value):
+    '''
+    Helper function that turns a normalized cell into text so that every page
+    shares one schema (lists and dicts left over by json_normalize become json)
+    -----
+    Input:
+
+    value - Cell value from pd.json_normalize
+    -----
+    Output:
+
+    text (str) - Text form of value or None for missing values
+    '''
+    if isinstance(value, (list, dict)):
+        return json.dumps(value)
+    if value is None or (isinstance(value, float) and value != value):
+        return None
+    return str(value)
+
+class PageSink:
+    '''
+    Streaming writer that normalizes one page of Bundle entries at a time and
+    appends it to an on-disk dataset, so memory stays constant per page and
+    total I/O is linear in the size of the output.
+
+    Output is a CSV file, or a Parquet dataset (directory of part files with
+    one row group per page, pages_per_part row groups per file) when path ends
+    in .parquet and pyarrow is installed. FHIR resources are sparse, so no
+    field is ever dropped: each Parquet part file has its own schema (a new
+    part is started when a page brings new columns), and CSV columns are fixed
+    by the first page (or the existing header when appending) with fields that
+    appear later stored per row as a json object in the overflow column. Use
+    read_output to load either format with the union of every column.
+    -----
+    Inputs:
+
+    path (str) - Output CSV file or .parquet dataset directory
+
+    append (bool) - Whether to keep and extend existing output (e.g. when
+                    resuming a crawl) instead of replacing it
+
+    pages_per_part (int) - Number of pages per Parquet part file
+    '''
+    def __init__(self, path, append=False, pages_per_part=50):
+        self.path = path
+        self.pages_per_part = pages_per_part
+        self.part_pages = 0
+        self.parquet = path.endswith('.parquet')
+        if self.parquet and pa is None:
+            raise ImportError('pyarrow is required to write Parquet output')
+        self.columns = None # CSV header or columns of the open Parquet part
+        self.writer = None
+        self.overflowed = set()
+        self.rows = 0
+        if not append:
+            self.remove_output()
+        elif self.parquet:
+            for part in sorted(glob.glob(os.path.join(path, 'part-*.parquet'))):
+                try:
+                    pq.read_schema(part)
+                except (OSError, pa.ArrowInvalid): # Catch part left open by a crash
+                    print(f'Removing incomplete part file {part}')
+                    os.remove(part)
+        elif os.path.exists(path):
+            self.columns = list(pd.read_csv(path, nrows=0).columns)
+            if overflow_column not in self.columns:
+                self.add_overflow_column()
+
+    def remove_output(self):
+        '''
+        Delete any output left by a previous run
+        '''
+        if self.parquet:
+            for part in glob.glob(os.path.join(self.path, 'part-*.parquet')):
+                os.remove(part)
+        elif os.path.exists(self.path):
+            os.remove(self.path)
+
+    def add_overflow_column(self, chunk_size=100000):
+        '''
+        Rewrite an existing CSV (e.g. one written before the overflow column
+        existed) with an empty overflow column, a chunk of rows at a time
+        '''
+        temp_path = self.path + '.tmp'
+        header = True
+        for chunk in pd.read_csv(self.path, dtype=str, chunksize=chunk_size):
+            chunk[overflow_column] = None
+            chunk.to_csv(temp_path, mode='w' if header else 'a', index=False, header=header)
+            header = False
+        if header: # Header only
+            pd.DataFrame(columns=self.columns + [overflow_column]).to_csv(temp_path, index=False)
+        os.replace(temp_path, self.path)
+        self.columns.append(overflow_column)
+
+    def write(self, entries):
+        '''
+        Normalize and append one page of entries
+        -----
+        Input:
+
+        entries (list) - List of json objects from a Bundle's entry element
+        -----
+        Output:
+
+        row_count (int) - Number of rows written for this page
+        '''
+        if not entries:
+            return 0
+        page = pd.json_normalize(entries)
+        if self.parquet:
+            self.write_parquet(page)
+        else:
+            self.write_csv(page)
+        self.rows += page.shape[0]
+        return page.shape[0]
+
+    def write_csv(self, page):
+        '''
+        Append page to the CSV file, moving columns missing from the header
+        into the overflow column
+        '''
+        if self.columns is None:
+            self.columns = list(page.columns) + [overflow_column]
+        extra = [column for column in page.columns if column not in self.columns]
+        new_columns = set(extra) - self.overflowed
+        if new_columns:
+            print(f'Storing column(s) not on the first page in {overflow_column}: {sorted(new_columns)}')
+            self.overflowed |= new_columns
+        overflow = [{column: to_text(value) for column, value in zip(extra, values) if to_text(value) is not None}
+                    for values in page[extra].itertuples(index=False, name=None)] if extra else []
+        page = page.reindex(columns=self.columns)
+        page[overflow_column] = [json.dumps(fields) if fields else None for fields in overflow] or None
+        page.to_csv(self.path, mode='a', index=False,
+                    header=not os.path.exists(self.path))
+
+    @property
+    def committed(self):
+        '''
+        Whether every row written so far is safely on disk (always true for
+        CSV; true for Parquet only when no part file is open)
+        '''
+        return self.writer is None
+
+    def write_parquet(self, page):
+        '''
+        Append page to the current Parquet part file as a new row group,
+        starting a new part when the page has columns the open part lacks
+        '''
+        if self.writer is not None and not set(page.columns) <= set(self.columns):
+            self.close()
+        if self.writer is None:
+            self.columns = list(page.columns)
+            os.makedirs(self.path, exist_ok=True)
+            part_number = len(glob.glob(os.path.join(self.path, 'part-*.parquet')))
+            while os.path.exists(os.path.join(self.path, f'part-{part_number:05d}.parquet')):
+                part_number += 1
+            schema = pa.schema([(column, pa.string()) for column in self.columns])
+            part_path = os.path.join(self.path, f'part-{part_number:05d}.parquet')
+            self.writer = pq.ParquetWriter(part_path, schema)
+        page = page.reindex(columns=self.columns)
+        arrays = [pa.array([to_text(value) for value in page[column].values], type=pa.string())
+                  for column in self.columns]
+        self.writer.write_table(pa.Table.from_arrays(arrays, names=self.columns))
+        self.part_pages += 1
+        if self.part_pages >= self.pages_per_part:
+            self.close()
+
+    def close(self):
+        '''
+        Flush and close the output
+        '''
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+            self.part_pages = 0
+
+def read_output(path):
+    '''
+    Function that loads the output of a PageSink with the union of every
+    column: Parquet part files are read one at a time and concatenated, and
+    CSV overflow fields are expanded back into columns
+    -----
+    Input:
+
+    path (str) - Output CSV file or .parquet dataset directory
+    -----
+    Output:
+
+    df (DataFrame) - Every row written, with missing fields left empty
+    '''
+    if path.endswith('.parquet'):
+        if pq is None:
+            raise ImportError('pyarrow is required to read Parquet output')
+        parts = [pq.read_table(part).to_pandas()
+                 for part in sorted(glob.glob(os.path.join(path, 'part-*.parquet')))]
+        return pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
+    df = pd.read_csv(path)
+    if overflow_column not in df.columns:
+        return df
+    overflow = df.pop(overflow_column).dropna().map(json.loads)
+    if overflow.empty:
+        return df
+    extra = pd.DataFrame(list(overflow), index=overflow.index)
+    return pd.concat([df, extra.reindex(df.index)], axis=1)
@@ -0,0 +1,196 @@
+# Import necessary libraries
+import math
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from stream_json import BundleStream
+
+# Define global variables
+offset_params = ('_getpagesoffset', '_offset') # Link parameters holding a row offset
+page_params = ('page',) # Link parameters holding a 1-based page number
+max_prefetch = 4 # Default number of pages fetched ahead in parallel
+
+class Page:
+    '''
+    Fully downloaded search Bundle page with the same interface as
+    stream_json.BundleStream (entries(), total, next_url()), used for pages
+    fetched ahead on a background thread
+    -----
+    Input:
+
+    bundle (BundleStream) - Page to read to the end
+    '''
+    def __init__(self, bundle):
+        self.entry_list = list(bundle.entries())
+        self.total = bundle.total
+        self.links = bundle.links
+        self.next_link = bundle.next_url()
+        self.resource_type = bundle.resource_type
+        self.issue = bundle.issue
+
+    def entries(self):
+        return iter(self.entry_list)
+
+    def next_url(self):
+        return self.next_link
+
+# Define necessary functions
+def check_bundle(bundle, url, finished=True):
+    '''
+    Helper function that raises ValueError when a page is not a search Bundle
+    (e.g. an OperationOutcome), so a failed page never looks like the end of
+    the search; resource_type may still be unknown before a stream is finished
+    '''
+    if bundle.resource_type != 'Bundle' and (finished or bundle.resource_type is not None):
+        diagnostics = '; '.join(str(issue.get('diagnostics') or issue.get('code'))
+                                for issue in bundle.issue or [])
+        raise ValueError(f'Expected a Bundle from {url}, got {bundle.resource_type}'
+                         + (f': {diagnostics}' if diagnostics else ''))
+    return bundle
+
+def get_bundle(session, url):
+    '''
+    Function that requests one search page and returns it as a BundleStream
+    -----
+    Inputs:
+
+    session (Session) - requests Session to use (see fhir_client)
+
+    url (str) - API call of the page
+    -----
+    Output:
+
+    bundle (BundleStream) - Page, not yet read past the Bundle header
+
+    Raises requests.HTTPError for an error status and ValueError when the
+    server answers with something other than a Bundle
+    '''
+    response = session.get(url, stream=True)
+    response.raise_for_status()
+    return check_bundle(BundleStream(response), url, finished=False)
+
+def replace_param(url, name, value):
+    '''
+    Helper function that returns url with query parameter name set to value
+    '''
+    parts = urlsplit(url)
+    query = [(key, str(value) if key == name else item)
+             for key, item in parse_qsl(parts.query, keep_blank_values=True)]
+    return urlunsplit(parts._replace(query=urlencode(query, safe=',:$|')))
+
+def predict_page_urls(current_url, next_url, total):
+    '''
+    Function that computes every remaining page URL when a server's next links
+    are offset- or page-number based (e.g. HAPI's _getpagesoffset=100); opaque
+    cursor tokens cannot be predicted
+    -----
+    Inputs:
+
+    current_url (str) - API call of the page just read
+
+    next_url (str) - That page's next link
+
+    total (int) - Bundle total (number of matching resources)
+    -----
+    Output:
+
+    page_urls (list) - Remaining page URLs starting with next_url, or None if
+                       the links cannot be predicted
+    -----
+    Example:
+
+    >>> predict_page_urls(base + 'Location?_count=100',
+    ...                   base + '?_getpages=abc&_getpagesoffset=100&_count=100', 250)
+    [base + '?_getpages=abc&_getpagesoffset=100&_count=100',
+     base + '?_getpages=abc&_getpagesoffset=200&_count=100']
+    '''
+    if not total or next_url is None:
+        return None
+    current_query = dict(parse_qsl(urlsplit(current_url).query))
+    next_query = dict(parse_qsl(urlsplit(next_url).query))
+    try:
+        for name in offset_params:
+            if name in next_query:
+                next_offset = int(next_query[name])
+                step = next_offset - int(current_query.get(name, 0))
+                if step <= 0:
+                    return None
+                return [replace_param(next_url, name, offset)
+                        for offset in range(next_offset, total, step)]
+        for name in page_params:
+            if name in next_query and '_count' in next_query:
+                next_page = int(next_query[name])
+                last_page = math.ceil(total / int(next_query['_count']))
+                return [replace_param(next_url, name, page)
+                        for page in range(next_page, last_page + 1)]
+    except ValueError: # Catch non-numeric offsets (opaque tokens)
+        return None
+    return None
+
+def iter_pages(session, first_url, prefetch=max_prefetch, link_suffix=''):
+    '''
+    Generator over every page of a FHIR search. After the first page, if the
+    next links are predictable (see predict_page_urls) up to prefetch pages are
+    fetched ahead in parallel; otherwise next links are followed one at a time.
+    Pages are always yielded in order.
+    -----
+    Inputs:
+
+    session (Session) - requests Session to use (see fhir_client)
+
+    first_url (str) - API call of the first page to read
+
+    prefetch (int) - Number of pages fetched ahead in parallel
+
+    link_suffix (str) - String appended to every next link followed
+                        (e.g. search parameters a server drops from its links)
+    -----
+    Output:
+
+    page (BundleStream or Page) - One page with entries(), total and next_url()
+
+    Raises requests.HTTPError or ValueError (see get_bundle) on a failed page
+    instead of ending the search early
+    '''
+    def fetch(url):
+        return check_bundle(Page(get_bundle(session, url)), url)
+
+    url = first_url
+    bundle = get_bundle(session, url)
+    yield bundle
+    for entry in bundle.entries(): # Finish reading in case links follow entry[]
+        pass
+    check_bundle(bundle, url)
+    next_url = bundle.next_url()
+    if next_url is None:
+        return
+    next_url += link_suffix
+    page_urls = predict_page_urls(url, next_url, bundle.total) if prefetch > 1 else None
+
+    # Opaque cursor: follow next links serially
+    if page_urls is None:
+        while next_url is not None:
+            bundle = get_bundle(session, next_url)
+            yield bundle
+            for entry in bundle.entries():
+                pass
+            check_bundle(bundle, next_url)
+            next_url = bundle.next_url()
+            if next_url is not None:
+                next_url += link_suffix
+        return
+
+    # Predictable links: keep a window of prefetch pages in flight
+    with ThreadPoolExecutor(max_workers=prefetch) as executor:
+        futures = [executor.submit(fetch, page_url) for page_url in page_urls[:prefetch]]
+        submitted = len(futures)
+        position = 0
+        while position < len(futures):
+            page = futures[position].result()
+            futures[position] = None
+            position += 1
+            if submitted < len(page_urls):
+                futures.append(executor.submit(fetch, page_urls[submitted]))
+                submitted += 1
+            yield page
+            if not page.entry_list: # Server ran out of pages early
+                break
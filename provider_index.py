@@ -0,0 +1,213 @@
+# Import necessary libraries
+import ast
+import numpy as np
+import pandas as pd
+try:
+    from pyroaring import BitMap # Compressed (Roaring) bitmaps
+except ImportError: # pyroaring is optional; without it bitmaps are Python integers
+    BitMap = None
+
+# Define global variables
+# providers table column -> providers.csv header (see create_providers_table.sql)
+table_columns = {'id': 'id',
+                 'specialty': 'Specialty',
+                 'networks': 'Networks',
+                 'city': 'City',
+                 'carrier': 'Carrier'}
+no_network = ('Not accepting patients', 'Unrecognized network')
+
+class IntBitmap:
+    '''
+    Bitmap of row ids stored in a single Python integer (bit i set when row i
+    is a member); the fallback when pyroaring is not installed. Supports the
+    same set operators as pyroaring.BitMap (&, |, -, len, iteration, in).
+    -----
+    Input:
+
+    value (int) - Integer holding the bits
+    '''
+    def __init__(self, value=0):
+        self.value = value
+
+    def __and__(self, other):
+        return IntBitmap(self.value & other.value)
+
+    def __or__(self, other):
+        return IntBitmap(self.value | other.value)
+
+    def __sub__(self, other):
+        return IntBitmap(self.value & ~other.value)
+
+    def __eq__(self, other):
+        return isinstance(other, IntBitmap) and self.value == other.value
+
+    def __len__(self):
+        return self.value.bit_count()
+
+    def __contains__(self, row):
+        return (self.value >> row) & 1 == 1
+
+    def __iter__(self):
+        return iter(bitmap_rows(self).tolist())
+
+    def __repr__(self):
+        return f'IntBitmap({len(self)} rows)'
+
+# Define necessary functions
+def make_bitmap(rows):
+    '''
+    Function that builds a bitmap (pyroaring.BitMap, or IntBitmap) from row ids
+    -----
+    Input:
+
+    rows (array) - Sorted or unsorted row ids (non-negative integers)
+    -----
+    Output:
+
+    bitmap (BitMap or IntBitmap) - Bitmap with those rows set
+    '''
+    rows = np.asarray(rows, dtype=np.int64)
+    if BitMap is not None:
+        return BitMap(rows.astype(np.uint32))
+    if not len(rows):
+        return IntBitmap(0)
+    bits = np.zeros(int(rows.max()) + 1, dtype=bool)
+    bits[rows] = True
+    return IntBitmap(int.from_bytes(np.packbits(bits, bitorder='little').tobytes(), 'little'))
+
+def bitmap_rows(bitmap):
+    '''
+    Function that returns the row ids set in a bitmap as a sorted NumPy array
+    '''
+    if not isinstance(bitmap, IntBitmap):
+        return np.fromiter(bitmap, dtype=np.int64, count=len(bitmap))
+    value = bitmap.value
+    if not value:
+        return np.zeros(0, dtype=np.int64)
+    data = np.frombuffer(value.to_bytes((value.bit_length() + 7) // 8, 'little'), dtype=np.uint8)
+    return np.flatnonzero(np.unpackbits(data, bitorder='little'))
+
+def union(bitmaps):
+    '''
+    Helper function that ORs a list of bitmaps (empty bitmap for an empty list)
+    '''
+    result = make_bitmap([])
+    for bitmap in bitmaps:
+        result = result | bitmap
+    return result
+
+def parse_networks(value):
+    '''
+    Helper function that reads a stored Networks value (a stringified Python
+    list, e.g. "['Kaiser EPO Network', 'Kaiser HMO Network']") back into a list
+    '''
+    if isinstance(value, list):
+        return value
+    try:
+        networks = ast.literal_eval(value)
+    except (ValueError, SyntaxError):
+        return []
+    return networks if isinstance(networks, list) else []
+
+class ProviderIndex:
+    '''
+    In-memory inverted index over a providers snapshot: each facet value maps
+    to a bitmap of row ids, so multi-facet filters such as "Kaiser HMO
+    Network psychiatrists in Berkeley or Oakland" become a few bitmap ANDs/ORs
+    instead of row-by-row scans of the networks column
+    -----
+    Input:
+
+    providers (DataFrame) - providers.csv or the providers table (either
+                            header style); rows are numbered by position
+    -----
+    Example:
+
+    >>> index = load_provider_index('providers.csv')
+    >>> rows = index.query(carrier='Kaiser', networks=['Kaiser HMO Network'],
+    ...                    specialties=['Psychiatry'], cities=['Berkeley', 'Oakland'])
+    >>> index.providers.iloc[index.positions(rows)]
+    '''
+    def __init__(self, providers):
+        self.providers = providers.rename(columns=table_columns).reset_index(drop=True)
+        self.all_rows = make_bitmap(np.arange(len(self.providers)))
+        self.carriers = self.build_facet(self.providers['Carrier'])
+        self.specialties = self.build_facet(self.providers['Specialty'])
+        self.cities = self.build_facet(self.providers['City'])
+
+        # (carrier, network) -> rows; each distinct Networks list is parsed once
+        networks_text = self.providers['Networks'].astype(str)
+        groups = self.providers.groupby([self.providers['Carrier'], networks_text], sort=False).indices
+        network_rows = {}
+        for (carrier, text), rows in groups.items():
+            for network in set(parse_networks(text)):
+                if network not in no_network:
+                    network_rows.setdefault((carrier, network), []).append(rows)
+        self.networks = {key: make_bitmap(np.concatenate(parts)) for key, parts in network_rows.items()}
+
+    @staticmethod
+    def build_facet(column):
+        '''
+        Helper that maps every distinct value of a column to its row bitmap
+        '''
+        return {value: make_bitmap(rows)
+                for value, rows in column.groupby(column, sort=False).indices.items()}
+
+    def plan(self, carrier, network=None):
+        '''
+        Rows in a carrier (network None) or in one of its networks/plans
+        '''
+        if network is None:
+            return self.carriers.get(carrier, make_bitmap([]))
+        return self.networks.get((carrier, network), make_bitmap([]))
+
+    def query(self, carrier=None, networks=None, specialties=None, cities=None):
+        '''
+        Rows matching every given facet, where a facet given as a list matches
+        any of its values (AND across facets, OR within a facet)
+        -----
+        Inputs:
+
+        carrier (str) - Carrier name (e.g. 'Kaiser')
+
+        networks (list) - Network/plan names of carrier (requires carrier)
+
+        specialties (list) - Specialty names
+
+        cities (list) - City names
+        -----
+        Output:
+
+        rows (BitMap or IntBitmap) - Matching row ids
+        '''
+        result = self.all_rows
+        if carrier is not None:
+            result = result & self.plan(carrier)
+        if networks is not None:
+            result = result & union([self.plan(carrier, network) for network in networks])
+        if specialties is not None:
+            result = result & union([self.specialties.get(name, make_bitmap([])) for name in specialties])
+        if cities is not None:
+            result = result & union([self.cities.get(name, make_bitmap([])) for name in cities])
+        return result
+
+    def positions(self, rows):
+        '''
+        Row positions of a bitmap, for DataFrame.iloc
+        '''
+        return bitmap_rows(rows)
+
+def load_provider_index(path='providers.csv'):
+    '''
+    Function that builds a ProviderIndex from the providers.csv snapshot (the
+    file copied into the providers table)
+    -----
+    Input:
+
+    path (str) - Path of providers.csv
+    -----
+    Output:
+
+    index (ProviderIndex) - Inverted index over the providers
+    '''
+    return ProviderIndex(pd.read_csv(path, dtype={'Zip Code': str}))
@@ -1,7 +1,6 @@
 # Import necessary libraries
 import os.path
 import sys
-import requests
 import re
 import pandas as pd
 import numpy as np
@@ -9,10 +8,27 @@ import warnings
 warnings.simplefilter("ignore", UserWarning)
 from geopy.geocoders import Nominatim
 import json
+from urllib.parse import urlsplit
 import psycopg2
+from async_fetch import fetch_all
+from fhir_client import get_session
+from resource_cache import ResourceCache
+from crawl_state import load_watermark, save_watermark
+from seen_set import SeenSet
+from geocode_cache import GeocodeCache
+from reverse_geocode import load_place_index
+from coordinate_resolver import CoordinateResolver, load_address_points
+from geocode_queue import GeocodeQueue
+from address_parser import parse_addresses, unit_pattern
 
 # Define global variables
+# Usage: python provider_script.py <United|Kaiser> <city> [--incremental]
+#   --incremental only asks for providers changed since the last sync of the
+#   same carrier and city (recorded in sync_state.json); the first run is full
 file_exists = os.path.exists('providers.csv')
+incremental = '--incremental' in sys.argv[3:]
+sync_state_path = 'sync_state.json'
+session = get_session()
 insurance_carrier = sys.argv[1]
 if insurance_carrier == 'United':
     base_url = 'https://public.fhir.flex.optum.com/R4/'
@@ -22,15 +38,152 @@ elif insurance_carrier == 'Kaiser':
 practitionerRole = 'PractitionerRole?'
 city = sys.argv[2]
 search_param = f'location.address-city={city}&location.address-state=CA'
+sync_key = f'{insurance_carrier}|{city.strip().casefold()}' # Watermarks are kept per carrier and city
 supplement = ''
+include_param = '&_include=PractitionerRole:location&_include=PractitionerRole:service'
 full_query = base_url + practitionerRole + search_param + supplement
 kaiser_networks = {'Exclusive_Provider_Organization_(EPO)_CN': 'Kaiser EPO Network',
                    'HMO_CN': 'Kaiser HMO Network',
                    'Medi-Cal_Managed_Care_CN': 'Kaiser Medi-Cal Network',
                    'Point-of-Service_Plan_(POS)_CN': 'Kaiser Point-of-Service Network',
                    'Senior_Advantage_CN': 'Kaiser Senior Advantage Network'}
+network_bits = {network: 1 << bit for bit, network in enumerate(kaiser_networks.values())} # Network Mask code table
+network_carriers = {network: 'Kaiser' for network in kaiser_networks.values()}
+carrier_order = ['Aetna', 'Anthem', 'Blue Shield', 'Cigna', 'Kaiser', 'Oscar Health', 'UnitedHealthcare']
+carrier_masks = {carrier: sum(bit for network, bit in network_bits.items() if network_carriers[network] == carrier)
+                 for carrier in carrier_order}
+resource_cache = ResourceCache(path='resource_cache.sqlite',
+                               ttl=7 * 24 * 60 * 60) # Location/HealthcareService refresh weekly
+seen = SeenSet() # PractitionerRoles already processed this run
+geocode_cache = GeocodeCache(path='geocode_cache.sqlite') # Nominatim results, including misses
+gazetteer_path = os.environ.get('PLACES_GAZETTEER', '2023_Gaz_place_national.txt') # Census place centroids
+address_points_path = os.environ.get('ADDRESS_POINTS', 'address_points.csv') # OpenAddresses CSV
+whitespace_pattern = re.compile(r'\s')
+nominatim_url = os.environ.get('NOMINATIM_URL', 'https://nominatim.openstreetmap.org/search/') # Or a self-hosted instance
+geocode_workers = int(os.environ.get('GEOCODE_WORKERS', '1')) # Raise only for a self-hosted instance
 
 # Define necessary functions
+def reference_type(url):
+    '''
+    Helper function that returns the resource type a resource API call refers to
+    (e.g. 'Location' for base_url + 'Location/123')
+    '''
+    parts = urlsplit(url).path.rstrip('/').split('/')
+    return parts[-2] if len(parts) >= 2 else None
+
+def prefetch_resources(urls):
+    '''
+    Function that resolves every unique resource API call in urls, answering
+    from resource_cache where possible and fetching the rest concurrently
+    (see async_fetch.fetch_all) so that a whole page of references resolves
+    in roughly one round trip
+    -----
+    Input:
+
+    urls (list) - List of strings corresponding to resource API calls
+    -----
+    Output:
+
+    resources (dict) - Dictionary mapping each API call to its json object
+                       (None for failed calls and for replies that are not
+                       the referenced resource type, which are never cached)
+    '''
+    resources = {}
+    for url in dict.fromkeys(urls):
+        resources[url] = resource_cache.get(url)
+    missing = [url for url, json_object in resources.items() if json_object is None]
+    fetched = {url: json_object if (json_object or {}).get('resourceType') == reference_type(url) else None
+               for url, json_object in zip(missing, fetch_all(missing))}
+    resource_cache.set_many(fetched)
+    resources.update(fetched)
+    return resources
+
+def get_resources(urls, resources=None):
+    '''
+    Function that returns the json object for every API call in urls, in order,
+    using the prefetched resources where available and fetching the rest
+    -----
+    Inputs:
+
+    urls (list) - List of strings corresponding to resource API calls
+
+    resources (dict) - Optional dictionary of prefetched json objects
+                       (see prefetch_resources)
+    -----
+    Output:
+
+    json_objects (list) - List of json objects; failed calls are empty dicts
+    '''
+    if resources is None:
+        resources = {}
+    missing = [url for url in urls if url not in resources]
+    if missing:
+        resources.update(prefetch_resources(missing))
+    return [resources.get(url) or {} for url in urls]
+
+def split_bundle_entries(entries):
+    '''
+    Function that separates the PractitionerRole matches in a search Bundle from
+    the resources the server returned because of _include, so that included
+    Location and HealthcareService resources can be joined in memory
+    -----
+    Input:
+
+    entries (list) - List of json objects from the Bundle's entry element
+    -----
+    Outputs:
+
+    provider_list (list) - List of json objects each referring to a single provider
+
+    included (dict) - Dictionary mapping resource API calls (base_url + reference)
+                      to the included json objects
+    '''
+    provider_list = []
+    included = {}
+    for entry in entries or []:
+        resource = entry.get('resource') or {}
+        search_mode = (entry.get('search') or {}).get('mode')
+        if search_mode == 'include' or resource.get('resourceType') not in (None, 'PractitionerRole'):
+            reference = f"{resource.get('resourceType')}/{resource.get('id')}"
+            included[base_url + reference] = resource
+        else:
+            provider_list.append(entry)
+    return provider_list, included
+
+def search_practitioner_roles(query):
+    '''
+    Function that makes the first PractitionerRole search with _include for the
+    referenced Location and HealthcareService resources, falling back to a plain
+    search if the carrier rejects _include
+    -----
+    Input:
+
+    query (str) - PractitionerRole search API call without _include
+    -----
+    Output:
+
+    json_object (dict) - Search Bundle as a json object
+    '''
+    request = session.get(query + include_param)
+    try:
+        json_object = request.json()
+    except ValueError: # Catch non-json error page
+        json_object = {}
+    if request.ok and json_object.get('resourceType') == 'Bundle':
+        return json_object
+    print('_include not supported, falling back to individual reference lookups')
+    return session.get(query).json()
+
+def next_link(json_object):
+    '''
+    Helper function that returns the URL of a search Bundle's next page (the
+    link with relation 'next') or None on the last page
+    '''
+    for link in json_object.get('link') or []:
+        if link.get('relation') == 'next':
+            return link.get('url')
+    return None
+
 def get_healthcareService_refs(provider_list):
     '''
     Function that extracts the HealthcareService resource reference from a list of
@@ -56,7 +209,7 @@ def get_healthcareService_refs(provider_list):
             healthcareService_refs.append('None')
     return healthcareService_refs
 
-def extract_specialty_and_number(healthcareServiceUrls):
+def extract_specialty_and_number(healthcareServiceUrls, resources=None):
     '''
     Function that takes a HealthcareService API call and extracts the provider taxonomy code
     and the corresponding plain English specialty
@@ -64,6 +217,8 @@ def extract_specialty_and_number(healthcareServiceUrls):
     Input:
     
     healthcareServiceUrls (list) - List of strings corresponding to HealthcareService resource API call
+
+    resources (dict) - Optional prefetched json objects (see get_resources)
     -----
     Outputs:
     
@@ -79,11 +234,9 @@ def extract_specialty_and_number(healthcareServiceUrls):
     '''
     specialties = []
     numbers = []
-    for url in healthcareServiceUrls:
-        request = requests.get(url)
-        json_object = request.json()
+    for json_object in get_resources(healthcareServiceUrls, resources):
         specialty_object = json_object.get('specialty')
-        contact_object = json_object.get('telecom')[0]
+        contact_object = (json_object.get('telecom') or [{}])[0]
         try:
             specialty_dict = specialty_object[0].get('coding')[0]
             code = specialty_dict.get('code')
@@ -96,7 +249,7 @@ def extract_specialty_and_number(healthcareServiceUrls):
         numbers.append(number)
     return specialties, numbers
 
-def extract_healthcareservice_resource(healthcareServiceUrls, carrier):
+def extract_healthcareservice_resource(healthcareServiceUrls, carrier, resources=None):
     '''
     Function that takes a HealthcareService API call and extracts the provider taxonomy code
     and the corresponding plain English specialty
@@ -105,7 +258,9 @@ def extract_healthcareservice_resource(healthcareServiceUrls, carrier):
     
     healthcareServiceUrls (list) - List of strings corresponding to HealthcareService resource API call
 
-    carrier (str)
+    carrier (str) - String designating insurance carrier
+
+    resources (dict) - Optional prefetched json objects (see get_resources)
     -----
     Output(s):
     
@@ -134,13 +289,9 @@ def extract_healthcareservice_resource(healthcareServiceUrls, carrier):
     numbers (list) - See extract_specialty_and_position
     '''
     if carrier == 'United':
-        return extract_specialty_and_number(healthcareServiceUrls)        
-    else:
-        specialties = []
-    for url in healthcareServiceUrls:
-        
-        request = requests.get(url)
-        json_object = request.json()
+        return extract_specialty_and_number(healthcareServiceUrls, resources)
+    specialties = []
+    for json_object in get_resources(healthcareServiceUrls, resources):
         specialty_object = json_object.get('specialty')
         try:
             specialty_dict = specialty_object[0].get('coding')[0]
@@ -152,7 +303,7 @@ def extract_healthcareservice_resource(healthcareServiceUrls, carrier):
         specialties.append(specialty)
     return specialties
 
-def extract_name_address_coordinates(location_urls):
+def extract_name_address_coordinates(location_urls, resources=None):
     '''
     Function that extracts all information from Location resource API calls
     United variant
@@ -160,6 +311,8 @@ def extract_name_address_coordinates(location_urls):
     Input:
 
     location_urls (list) - List of strings corresponding to Location resrouce API calls
+
+    resources (dict) - Optional prefetched json objects (see get_resources)
     -----
     Outputs:
     names (list) - List of provider names as strings
@@ -184,16 +337,15 @@ def extract_name_address_coordinates(location_urls):
     cities = []
     states = []
     zips = []
-    for url in location_urls:
-        request = requests.get(url)
-        json_object = request.json()
+    coordinates = []
+    for json_object in get_resources(location_urls, resources):
         name = json_object.get('name')
-        address_object = json_object.get('address')
-        coordinate_object = json_object.get('position')
+        address_object = json_object.get('address') or {}
+        coordinate_object = json_object.get('position') or {}
         street_address = address_object.get('text')
         city = address_object.get('city')
         state = address_object.get('state')
-        zip_code = address_object.get('postalCode')[:5]
+        zip_code = (address_object.get('postalCode') or '')[:5]
         lat = coordinate_object.get('latitude')
         lon = coordinate_object.get('longitude')
         coordinate = [lat, lon]
@@ -205,7 +357,7 @@ def extract_name_address_coordinates(location_urls):
         coordinates.append(coordinate)
     return names, addresses, cities, states, zips, coordinates
 
-def extract_location_resource(location_urls, carrier):
+def extract_location_resource(location_urls, carrier, resources=None):
     '''
     Function that extracts all information from Location resource API calls
     Calls helper function for certain carriers (see extract_name_address)
@@ -215,6 +367,8 @@ def extract_location_resource(location_urls, carrier):
     location_urls (list) - List of strings corresponding to Location resource API calls
 
     carrier (str) - String designating insurance carrier
+
+    resources (dict) - Optional prefetched json objects (see get_resources)
     -----
     Outputs:
     
@@ -249,7 +403,7 @@ def extract_location_resource(location_urls, carrier):
     coordinates (list) - See extract_name_address_coordinates
     '''
     if carrier == 'United':
-        return extract_name_address_coordinates(location_urls)
+        return extract_name_address_coordinates(location_urls, resources)
     else:
         names = []
         addresses = []
@@ -257,17 +411,15 @@ def extract_location_resource(location_urls, carrier):
         cities = []
         states = []
         zips = []
-        for url in location_urls:
-            request = requests.get(url)
-            json_object = request.json()
+        for json_object in get_resources(location_urls, resources):
             name = json_object.get('name')
-            address_object = json_object.get('address')
-            contact_object = json_object.get('telecom')[0]
+            address_object = json_object.get('address') or {}
+            contact_object = (json_object.get('telecom') or [{}])[0]
             street_address = address_object.get('text')
             number = contact_object.get('value')
             city = address_object.get('city')
             state = address_object.get('state')
-            zip_code = address_object.get('postalCode')[:5]
+            zip_code = (address_object.get('postalCode') or '')[:5]
             names.append(name)
             addresses.append(street_address)
             numbers.append(number)
@@ -291,13 +443,11 @@ def clean_address(address):
     cleaned_address (string) - Street address prepared for Nominatim
                                search engine API call
     '''
-    unit_pattern = 'Fl\s[\w\d]+\s|Ste\s[\w\d]+\s|Unit\s[\w\d]+\s|Unit\s[\w\d]+\s|Rm\s[\w\d]+\s'
-    try:
-        clean_w_spaces = re.sub(unit_pattern, '', address)
-        cleaned_address = re.sub('\s', '%20', clean_w_spaces)
-        return cleaned_address
-    except TypeError:
+    if not isinstance(address, str):
         return None
+    clean_w_spaces = unit_pattern.sub('', address)
+    cleaned_address = whitespace_pattern.sub('%20', clean_w_spaces)
+    return cleaned_address
 
 def nominatim_lookup(address):
     '''
@@ -311,13 +461,13 @@ def nominatim_lookup(address):
     
     coordinate (list) - List of strings corresponding to coordinates ([latitude, longitude])
     '''
-    nominatim_search = 'https://nominatim.openstreetmap.org/search/'
+    nominatim_search = nominatim_url
     set_json_format = '?format=json'
     cleaned_address = clean_address(address)
     try:
         nominatim_call = nominatim_search + cleaned_address + set_json_format
         try:
-            search_object = requests.get(nominatim_call).json()[0]
+            search_object = session.get(nominatim_call).json()[0]
             latitude = search_object.get('lat')
             longitude = search_object.get('lon')
             coordinate = [latitude, longitude]
@@ -328,32 +478,45 @@ def nominatim_lookup(address):
     except TypeError:
         return [None, None]
 
-def get_coordinates(addresses):
+def get_coordinates(addresses, positions=None):
     '''
-    Function that uses Nominatim search engine API to extract coordinates from
-    a list of street addresses
+    Function that finds coordinates for a list of street addresses, taking each
+    from the cheapest source available: the Location's position, the geocode
+    cache and the offline address-point file (see coordinate_resolver).
+    Addresses only the Nominatim search engine API can answer are queued for
+    background geocoding (see geocode_queue) and joined back by key at the end
+    of the crawl
     -----
-    Input:
+    Inputs:
     
     addresses (list) - List of street addresses as strings
+
+    positions (list) - Optional 2D list of coordinates from Location.position
+                       ([None, None] where a Location has no position)
     -----
-    Output:
+    Outputs:
     
-    coordinates (list) - 2D list of coordinates (latitude, longitude)
+    coordinates (list) - 2D list of coordinates (latitude, longitude);
+                         queued addresses are [None, None] for now
     
             [[latitude, longitude],
              [latitude, longitude],
                 ...        ...
              [latitude, longitude]]
+
+    keys (list) - List of normalized addresses (see geocode_cache.geocode_key)
     '''
+    positions = positions or [None] * len(addresses)
+    parsed = parse_addresses(addresses)
+    keys = list(parsed['geocode_key'])
     coordinates = []
-    for address in addresses:
-        try:
-            coordinate = nominatim_lookup(address)
-        except json.decoder.JSONDecodeError: # Catch unable to find coordinates error
-            coordinate = ['100.0', '200.0'] # Invalid coordinates to be entered in database
+    for address, key, position, point_key in zip(addresses, keys, positions, parsed['point_key']):
+        coordinate, tier = coordinate_resolver.resolve_local(address, key, position, point_key)
+        if tier is None:
+            geocode_queue.submit(address, key)
+            coordinate = [None, None]
         coordinates.append(coordinate)
-    return coordinates
+    return coordinates, keys
 
 
 def extract_network_name(providers_networks):
@@ -389,58 +552,82 @@ def extract_network_name(providers_networks):
             translated_networks.append(['Unrecognized network'])
     return translated_networks
 
-def network_finder(network_token, df):
+def encode_networks(translated_networks):
+    '''
+    Function that encodes each provider's networks (see extract_network_name)
+    as an integer bitmask using network_bits, so that network and carrier
+    columns can be derived with vectorized bit operations
+    -----
+    Input:
+
+    translated_networks (list) - List of lists of network names
+    -----
+    Output:
+
+    masks (list) - List of integers; bit i is set if the provider belongs to
+                   the i-th network of kaiser_networks (0 if none, e.g. not
+                   accepting patients or unrecognized network)
+    -----
+    Example:
+
+    >>> encode_networks([['Kaiser EPO Network', 'Kaiser HMO Network'], ['Not accepting patients']])
+    [3, 0]
+    '''
+    return [sum(network_bits.get(network, 0) for network in set(networks))
+            for networks in translated_networks]
+
+def network_finder(network, df):
     '''
-    Function that takes a string identifying which network and returns
-    a list identifying whether each provider in df is a part of the specified
-    network
+    Function that identifies whether each provider in df is part of the
+    specified network
     -----
     Inputs:
     
-    network_token (str) - String idetifying the network to look for
+    network (str) - Network name (a value of kaiser_networks)
     
-    df (DataFrame) - Pandas Dataframe with one provider per row to sear in
+    df (DataFrame) - Pandas Dataframe with one provider per row including
+                     column 'Network Mask' (see encode_networks)
     -----
     Output:
     
-    in_network_list (list) - List specifying whether each provider in df is in
-                             the network specified by network_token
+    in_network (array) - Array of 1/0 flags for each provider in df
     '''
-    in_network_list = []
-    providers_networks = df['Networks'].astype(str).values
-    if network_token == 'Medicare':
-        token = 'Senior Advantage'
-    elif network_token == 'POS':
-        token = 'Point-of-Service'
-    else:
-        token = network_token
-    for network_set in providers_networks:
-        if token in network_set:
-            in_network = 1
-        else:
-            in_network = 0
-        in_network_list.append(in_network)
-    return in_network_list
+    masks = df['Network Mask'].to_numpy(dtype=np.int64)
+    return ((masks & network_bits[network]) != 0).astype(int)
 
 def city_lookup(df_kaiser):
     '''
-    Function that makes a Nominatum API call to look up the city
-    from a longitude, latitude pair for an entire dataframe.
-    ** A Nominatim object, `geolocator`, must be created and initialized! **
+    Function that fills in the city for an entire dataframe. The city from the
+    Location resource is used when present; remaining rows are reverse geocoded
+    offline in one batch against a local gazetteer of place centroids (see
+    reverse_geocode), falling back to Nominatim API calls only when no
+    gazetteer file is available
     -----
     Input:
     
     df_kaiser (DataFrame) - Pandas DataFrame of Kaiser providers
                             including columns 'Latitude' and 'Longitude'
+                            (and optionally 'Location City')
     -----
     Output:
     
     cities (list) - List of cities as strings
     '''
-    cities = []
-    latitudes = df_kaiser['Latitude'].values
-    longitudes = df_kaiser['Longitude'].values
+    if 'Location City' in df_kaiser:
+        cities = df_kaiser['Location City'].to_numpy(dtype=object, copy=True)
+    else:
+        cities = np.full(len(df_kaiser), None, dtype=object)
+    missing = pd.isna(cities) | (cities == '')
+    if not missing.any():
+        return list(cities)
+    latitudes = df_kaiser['Latitude'].values[missing]
+    longitudes = df_kaiser['Longitude'].values[missing]
+    place_index = load_place_index(gazetteer_path)
+    if place_index is not None:
+        cities[missing] = place_index.lookup(latitudes, longitudes)
+        return list(cities)
     geolocator = Nominatim(user_agent="geoapiExercises")
+    looked_up = []
     for i in range(len(latitudes)):
         lat = latitudes[i]
         lon = longitudes[i]
@@ -450,39 +637,14 @@ def city_lookup(df_kaiser):
             city = address.get('city')
         except ValueError:
             city = None
-        cities.append(city)
-    return cities
-
-def extract_state_zip(address):
-    '''
-    Function that extracts city postal code and the zip code from
-    an address, address, as a string
-    -----
-    Input:
-    
-    address (str) - Singular address as a string
-    -----
-    Output:
-    
-    state_zip (list) - Python list of length one containing state, zip
-                       match
-    -----
-    Example:
-    
-    >>> address = "5601 Arnold Rd Dublin CA 94568"
-    >>> extract_state_zip(address)
-    ['CA 94568']
-    '''
-    try:
-        state_zip = re.findall(r'\w{2}\s\d+$', address)
-    except TypeError: # Catch error thrown when no address found in database
-        state_zip = ['XX 00000']
-        print('No address found in database')
-    return state_zip
+        looked_up.append(city)
+    cities[missing] = looked_up
+    return list(cities)
 
 def add_carriers(df):
     '''
-    Creates a list of insurance carrier for each listing in df
+    Creates the insurance carrier for each listing in df from its network
+    bitmask; the first carrier in carrier_order with a matching network wins
     List of insurance carriers to be included:
         Aetna
         Anthem
@@ -494,42 +656,20 @@ def add_carriers(df):
     -----
     Input:
     
-    df (DataFrame) - Pandas DataFrame with provider listings
+    df (DataFrame) - Pandas DataFrame with provider listings including
+                     column 'Network Mask' (see encode_networks)
     -----
     Output:
     
-    carriers (list) - Python list with insurance carrier for each
-                      provider listing; each provider listing
-                      should have only one designated carrier value
-    '''
-    carriers = []
-    at = 'Aetna'
-    an = 'Anthem'
-    bs = 'Blue Shield'
-    cg = 'Cigna'
-    kp = 'Kaiser'
-    os = 'Oscar Health'
-    un = 'UnitedHealthcare'
-    for provider in df['Networks'].values:
-        provider_listing = str(provider)
-        if at in provider_listing:
-            carrier = at
-        elif an in provider_listing:
-            carrier = an
-        elif bs in provider_listing:
-            carrier = bs
-        elif cg in provider_listing:
-            carrier = cg
-        elif kp in provider_listing:
-            carrier = kp
-        elif os in provider_listing:
-            carrier = os
-        elif un in provider_listing:
-            carrier = un
-        else:
-            carrier = None
-        carriers.append(carrier)
-    return carriers
+    carriers (Categorical) - Insurance carrier for each provider listing;
+                             each provider listing should have only one
+                             designated carrier value (missing if none)
+    '''
+    masks = df['Network Mask'].to_numpy(dtype=np.int64)
+    carriers = np.full(len(masks), None, dtype=object)
+    for carrier in reversed(carrier_order): # Earlier carriers overwrite later ones
+        carriers[(masks & carrier_masks[carrier]) != 0] = carrier
+    return pd.Categorical(carriers, categories=carrier_order)
 
 def add_accepting_patients_status(df):
     '''
@@ -541,145 +681,190 @@ def add_accepting_patients_status(df):
     -----
     Output:
     
-    active_status (list) - Python list with binary indicators
-                           of active status for each provider
-                           listing in df
+    active_status (array) - Array with binary indicators
+                            of active status for each provider
+                            listing in df
     '''
-    active_status = []
-    for provider_listing in df['Carrier'].values:
-        if provider_listing is None:
-            status = 0
-        else:
-            status = 1
-        active_status.append(status)
-    return active_status
+    return df['Carrier'].notna().to_numpy().astype(int)
 
-# Make API calls
-request = requests.get(full_query)
-json_object = request.json()
-total = json_object.get('total')
-entries_per_page = len(json_object.get('entry'))
-total_pages = total // 50 + 1
-print(f'Total Entries: {total}')
-print(f'Entries per Page: {entries_per_page}')
-page = 1
-print(f'Working on Page {page}...')
+def latest_last_updated(last_updated):
+    '''
+    Function that finds the newest "Last Updated" timestamp among the
+    providers of a crawl, formatted for a FHIR _lastUpdated search
+    -----
+    Input:
 
-# First page
-provider_list = json_object.get('entry')
-healthcareService_refs = get_healthcareService_refs(provider_list)
-healthcareServiceUrls = [base_url + ref for ref in healthcareService_refs]
-location_refs = [provider.get('resource').get('location')[0].get('reference')
-                 for provider in provider_list]
-location_urls = [base_url + ref for ref in location_refs]
-network_objects = [providers_networks.get('resource').get('extension')[1:]
-                   for providers_networks in json_object.get('entry')]
-
-id_codes = [provider.get('resource').get('id') for provider in provider_list]
-if insurance_carrier == 'United':
-    specialties, numbers = extract_healthcareservice_resource(healthcareServiceUrls,
-                                                              insurance_carrier)
-    names, addresses, cities, states, zip_codes, coordinates = extract_location_resource(location_urls,
-                                                                                         insurance_carrier)
-else:
-    specialties = extract_healthcareservice_resource(healthcareServiceUrls,
-                                                     insurance_carrier)
-    names, numbers, addresses, cities, states, zip_codes = extract_location_resource(location_urls,
-                                                                                     insurance_carrier)
-    coordinates = get_coordinates(addresses)
-codes = [specialty[0] for specialty in specialties]
-specialty_names = [specialty[1] for specialty in specialties]
-latitudes = [coordinate[0] for coordinate in coordinates]
-longitudes = [coordinate[1] for coordinate in coordinates]
-networks = extract_network_name(network_objects)
-last_updated = [provider.get('resource').get('meta').get('lastUpdated')
-                for provider in provider_list]
-
-# Create dataframe
-kaiser_providers = pd.DataFrame(data={'id_code': id_codes,
-                                      'Name': names, 
-                                      'Address': addresses,
-                                      'Phone Number': numbers,
-                                      'Latitude': latitudes, 
-                                      'Longitude': longitudes,
-                                      'Provider Taxonomy Code': codes,
-                                      'Specialty': specialty_names,
-                                      'Networks': networks,
-                                      'Last Updated': last_updated})
-
-try:
-    next_dict = json_object.get('link')[1]
-    next_url = next_dict.get('url')
-except IndexError: # If only one page, continue on
-    pass
-page += 1
+    last_updated (Series) - "Last Updated" column of the crawled providers
+    -----
+    Output:
 
-# Repeat above to account for pagination
-while page <= total_pages:
-    next_json_object = requests.get(next_url).json()
-    print(f'Working on Page {page}...')
-    provider_list = next_json_object.get('entry')
-    try:
-        healthcareService_refs = get_healthcareService_refs(provider_list)
-    except TypeError:
-        page += 1
-        continue
+    last_updated (str) - Newest timestamp as a UTC FHIR instant or None if no
+                         provider is dated
+    -----
+    Example:
+
+    >>> latest_last_updated(pd.read_csv('toy_data.csv')['Last Updated'])
+    '2022-11-18T14:08:52.477Z'
+    '''
+    timestamps = pd.to_datetime(last_updated, utc=True, errors='coerce')
+    newest = timestamps.max()
+    if pd.isnull(newest):
+        return None
+    return newest.isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+
+def build_page_dataframe(provider_list, included=None):
+    '''
+    Function that resolves every HealthcareService and Location reference on a
+    single page of PractitionerRole entries and builds the page's DataFrame.
+    References already included in the Bundle are joined in memory and the rest
+    are fetched concurrently in one batch (see get_resources)
+    -----
+    Inputs:
+
+    provider_list (list) - List of json objects each referring to a single provider
+
+    included (dict) - Optional included resources (see split_bundle_entries)
+    -----
+    Output:
+
+    page_df (DataFrame) - Pandas DataFrame with one provider per row
+    '''
+    healthcareService_refs = get_healthcareService_refs(provider_list)
     healthcareServiceUrls = [base_url + ref for ref in healthcareService_refs]
     location_refs = [provider.get('resource').get('location')[0].get('reference')
                      for provider in provider_list]
     location_urls = [base_url + ref for ref in location_refs]
-    network_objects = [providers_networks.get('resource').get('extension')[1:]
-                       for providers_networks in next_json_object.get('entry')]
-    
+    network_objects = [provider.get('resource').get('extension')[1:]
+                       for provider in provider_list]
+    resources = dict(included or {})
+    resource_cache.set_many(resources)
+    get_resources(healthcareServiceUrls + location_urls, resources)
+
     id_codes = [provider.get('resource').get('id') for provider in provider_list]
-    specialties = get_specialties(healthcareServiceUrls)
+    if insurance_carrier == 'United':
+        specialties, numbers = extract_healthcareservice_resource(healthcareServiceUrls,
+                                                                  insurance_carrier,
+                                                                  resources)
+        names, addresses, cities, states, zip_codes, positions = extract_location_resource(location_urls,
+                                                                                           insurance_carrier,
+                                                                                           resources)
+        coordinates, geocode_keys = get_coordinates(addresses, positions)
+    else:
+        specialties = extract_healthcareservice_resource(healthcareServiceUrls,
+                                                         insurance_carrier,
+                                                         resources)
+        names, addresses, numbers, cities, states, zip_codes = extract_location_resource(location_urls,
+                                                                                         insurance_carrier,
+                                                                                         resources)
+        positions = [[(json_object.get('position') or {}).get('latitude'),
+                      (json_object.get('position') or {}).get('longitude')]
+                     for json_object in get_resources(location_urls, resources)]
+        coordinates, geocode_keys = get_coordinates(addresses, positions)
     codes = [specialty[0] for specialty in specialties]
     specialty_names = [specialty[1] for specialty in specialties]
-    names, addresses, numbers = get_names_addresses_and_numbers(location_urls)
-    coordinates = get_coordinates(addresses)
     latitudes = [coordinate[0] for coordinate in coordinates]
     longitudes = [coordinate[1] for coordinate in coordinates]
     networks = extract_network_name(network_objects)
     last_updated = [provider.get('resource').get('meta').get('lastUpdated')
-                for provider in provider_list]
-
-    kaiser_df = pd.DataFrame(data={'id_code': id_codes,
-                                   'Name': names, 
-                                   'Address': addresses,
-                                   'Phone Number': numbers,
-                                   'Latitude': latitudes, 
-                                   'Longitude': longitudes,
-                                   'Provider Taxonomy Code': codes,
-                                   'Specialty': specialty_names,
-                                   'Networks': networks,
-                                   'Last Updated': last_updated})
-    
-    kaiser_providers = pd.concat([kaiser_providers, kaiser_df])
+                    for provider in provider_list]
+
+    page_df = pd.DataFrame(data={'id_code': id_codes,
+                                 'Name': names,
+                                 'Address': addresses,
+                                 'Phone Number': numbers,
+                                 'Latitude': latitudes,
+                                 'Longitude': longitudes,
+                                 'Provider Taxonomy Code': codes,
+                                 'Specialty': specialty_names,
+                                 'Networks': networks,
+                                 'Network Mask': encode_networks(networks), # Dropped before export
+                                 'Last Updated': last_updated,
+                                 'Location City': cities, # Used by city_lookup, dropped before export
+                                 'Geocode Key': geocode_keys}) # Joins queued geocodes, dropped before export
+    return page_df
+
+# Resolve coordinates from Location.position, the geocode cache, offline address points, then Nominatim
+coordinate_resolver = CoordinateResolver(geocode_cache,
+                                         nominatim_lookup,
+                                         address_points=load_address_points(address_points_path),
+                                         failed_coordinate=['100.0', '200.0']) # Invalid coordinates to be entered in database
+geocode_queue = GeocodeQueue(lambda address, key: coordinate_resolver.resolve_remote(address, key)[0],
+                             workers=geocode_workers)
+
+# Only ask for providers changed since the last sync of this carrier and city
+since = load_watermark(sync_state_path, sync_key)
+if incremental and file_exists:
+    if since is not None:
+        print(f'Incremental sync: fetching {city} providers updated after {since}')
+        full_query += f'&_lastUpdated=gt{since}'
+    else:
+        print(f'No previous {insurance_carrier} sync for {city}, running a full sync')
 
-    try:
-        next_dict = next_json_object.get('link')[1]
-        next_url = next_dict.get('url')
-    except IndexError: # Catch IndexError thrown if only one page of data exists
-        pass
+# Make API calls
+json_object = search_practitioner_roles(full_query)
+provider_list, included = split_bundle_entries(json_object.get('entry'))
+if not provider_list:
+    print('No providers to update')
+    resource_cache.close()
+    geocode_cache.close()
+    sys.exit()
+total = json_object.get('total')
+entries_per_page = len(provider_list)
+print(f'Total Entries: {total}')
+print(f'Entries per Page: {entries_per_page}')
+page = 1
+print(f'Working on Page {page}...')
+
+# First page
+provider_list = [provider for provider in provider_list if seen.claim_entry(provider)]
+kaiser_providers = build_page_dataframe(provider_list, included)
+
+next_url = next_link(json_object)
+page += 1
+
+# Follow next links until the last page (pages may hold fewer than _count
+# matches when included resources count toward the page size)
+while next_url is not None:
+    request = session.get(next_url)
+    request.raise_for_status() # A failed page must not look like the last one
+    next_json_object = request.json()
+    print(f'Working on Page {page}...')
+    provider_list, included = split_bundle_entries(next_json_object.get('entry'))
+    # Skip providers already seen on an earlier page (and their reference lookups)
+    provider_list = [provider for provider in provider_list if seen.claim_entry(provider)]
+    next_url = next_link(next_json_object)
     page += 1
+    if not provider_list:
+        continue
+
+    kaiser_df = build_page_dataframe(provider_list, included)
+    kaiser_providers = pd.concat([kaiser_providers, kaiser_df])
     
+seen.report()
+
 # Fix index
 kaiser_providers = kaiser_providers.reset_index() \
                                    .drop('index', axis=1)
 
+# Join coordinates geocoded in the background
+geocoded = geocode_queue.join()
+queued = kaiser_providers['Geocode Key'].isin(list(geocoded)) & kaiser_providers['Latitude'].isna()
+queued_coordinates = [geocoded[key] for key in kaiser_providers.loc[queued, 'Geocode Key']]
+kaiser_providers['Latitude'] = kaiser_providers['Latitude'].astype(object)
+kaiser_providers['Longitude'] = kaiser_providers['Longitude'].astype(object)
+kaiser_providers.loc[queued, 'Latitude'] = [coordinate[0] for coordinate in queued_coordinates]
+kaiser_providers.loc[queued, 'Longitude'] = [coordinate[1] for coordinate in queued_coordinates]
+coordinate_resolver.report()
+
 # Add networks
-kaiser_providers['Kaiser EPO Network'] = network_finder('EPO', kaiser_providers)
-kaiser_providers['Kaiser HMO Network'] = network_finder('HMO', kaiser_providers)
-kaiser_providers['Kaiser Medi-Cal Network'] = network_finder('Medi-Cal', kaiser_providers)
-kaiser_providers['Kaiser Point-of-Service Network'] = network_finder('POS', kaiser_providers)
-kaiser_providers['Kaiser Senior Advantage Network'] = network_finder('Medicare', kaiser_providers)
+for network in kaiser_networks.values(): # One column per network, in code table order
+    kaiser_providers[network] = network_finder(network, kaiser_providers)
 
 # Add state and zip code
 cities = city_lookup(kaiser_providers)
-state_zip = [extract_state_zip(address) for address in kaiser_providers['Address'].values]
-state_zip_split = [re.split(r'\s', state_w_zip[0]) for state_w_zip in state_zip]
-states = [split[0] for split in state_zip_split]
-zip_codes = [split[1] for split in state_zip_split]
+parsed_addresses = parse_addresses(kaiser_providers['Address']) # Missing parts stay empty
+states = parsed_addresses['state']
+zip_codes = parsed_addresses['zip5']
 kaiser_providers['City'] = cities
 kaiser_providers['State'] = states
 kaiser_providers['Zip Code'] = zip_codes
@@ -695,7 +880,7 @@ full_ids = kaiser_providers['id_code'].values
 kaiser_providers.insert(loc=0,
                         column='id',
                         value=full_ids)
-kaiser_providers = kaiser_providers.drop(labels=['id_code'],
+kaiser_providers = kaiser_providers.drop(labels=['id_code', 'Location City', 'Geocode Key', 'Network Mask'],
                                          axis=1)
 
 # Create csv or append to existing file and push changes to database
@@ -711,10 +896,11 @@ if file_exists:
     og_kaiser_providers = pd.read_csv('providers.csv')
     new_kaiser_providers = pd.concat([og_kaiser_providers,
                                       kaiser_providers])
-    # Check for duplicates
+    # Check for duplicates (keep the freshly crawled row so changes replace old rows)
     print('Checking for duplicates...')
     length = new_kaiser_providers.shape[0]
-    updated_kaiser_providers = new_kaiser_providers.drop_duplicates(subset='id')
+    updated_kaiser_providers = new_kaiser_providers.drop_duplicates(subset='id',
+                                                                    keep='last')
     updated_kaiser_providers.to_csv('providers.csv',
                                     index=False)
     updated_length = updated_kaiser_providers.shape[0]
@@ -735,4 +921,11 @@ else:
     create_providers_sql_file = open('create_providers_table.sql', 'r')
     cursor.execute(create_providers_sql_file.read())
     conn.commit()
-conn.close()
\ No newline at end of file
+conn.close()
+
+# Record the sync watermark for the next incremental run of this carrier and city
+watermark = latest_last_updated(pd.Series([since] + list(kaiser_providers['Last Updated'])))
+if watermark is not None:
+    save_watermark(sync_state_path, sync_key, watermark)
+resource_cache.close()
+geocode_cache.close()
\ No newline at end of file
@@ -1,7 +1,7 @@
 # Import necessary libraries
 import os.path
 import sys
-import requests
+from fhir_client import get_session
 import re
 import pandas as pd
 import numpy as np
@@ -10,6 +10,7 @@ import json
 
 # Define global variables
 file_exists = os.path.exists('toy_data.csv')
+session = get_session()
 base_url = 'https://kpx-service-bus.kp.org/service/hp/mhpo/healthplanproviderv1rc/'
 practitionerRole = 'PractitionerRole?'
 city = sys.argv[1]
@@ -68,7 +69,7 @@ def get_specialties(healthcareServiceUrls):
     '''
     specialties = []
     for url in healthcareServiceUrls:
-        request = requests.get(url)
+        request = session.get(url)
         json_object = request.json()
         specialty_object = json_object.get('specialty')
         specialty = [None, None]
@@ -103,7 +104,7 @@ def get_names_addresses_and_numbers(location_urls):
     addresses = []
     numbers = []
     for url in location_urls:
-        request = requests.get(url)
+        request = session.get(url)
         json_object = request.json()
         name = json_object.get('name')
         address_object = json_object.get('address')
@@ -156,7 +157,7 @@ def nominatim_lookup(address):
     try:
         nominatim_call = nominatim_search + cleaned_address + set_json_format
         try:
-            search_object = requests.get(nominatim_call).json()[0]
+            search_object = session.get(nominatim_call).json()[0]
             latitude = search_object.get('lat')
             longitude = search_object.get('lon')
             coordinate = [latitude, longitude]
@@ -424,7 +425,7 @@ def add_carrier_code(df):
     return ids
 
 # Make API calls
-request = requests.get(full_query)
+request = session.get(full_query)
 json_object = request.json()
 total = json_object.get('total')
 page = 1
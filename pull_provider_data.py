@@ -1,51 +1,94 @@
-import pandas as pd
 import sys
-import os.path
-import requests
-from requests.adapters import HTTPAdapter
-from requests.packages.urllib3.util.retry import Retry
+from fhir_client import get_session
+from crawl_state import load_checkpoint, save_checkpoint
+from page_sink import PageSink
+from paginate import iter_pages
+from bulk_export import (bulk_types, start_export, wait_for_manifest, manifest_files,
+                         local_files, iter_ndjson, iter_entry_pages)
 
 # Determine carrier from commmand line
+# Usage: python pull_provider_data.py <uhc|anthem> [--resume] [--parquet]
+#        python pull_provider_data.py <uhc|anthem> --bulk [base_url] [--parquet]
+#        python pull_provider_data.py <uhc|anthem> --ndjson <directory> [--parquet]
 carrier = sys.argv[1]
+options = sys.argv[2:]
+resume = '--resume' in options
+file_type = 'parquet' if '--parquet' in options else 'csv'
 if carrier == 'uhc':
-    url = 'https://public.fhir.flex.optum.com/R4/Location?_count=100&address-state=CA'
+    base_url = 'https://public.fhir.flex.optum.com/R4/'
     add_on = ''
 elif carrier == 'anthem':
-    url = 'https://cmsmanapi.anthem.com/fhir/cms_mandate/mcd/Location?_count=100&address-state=CA'
+    base_url = 'https://cmsmanapi.anthem.com/fhir/cms_mandate/mcd/'
     add_on = '&address-state=CA'
+url = base_url + 'Location?_count=100&address-state=CA'
+output_path = f'ca_{carrier}_providers.{file_type}'
+checkpoint_path = f'ca_{carrier}_providers.checkpoint.json'
+session = get_session()
 
-# Pull data from carrier API
-session = requests.Session()
-retry = Retry(connect=5, backoff_factor=2)
-adapter = HTTPAdapter(max_retries=retry)
-session.mount('http://', adapter)
-session.mount('https://', adapter)
-request = session.get(url)
-json_object = request.json()
+# Bulk Data ingestion: $export (or pre-downloaded NDJSON) instead of paging searches
+if '--bulk' in options or '--ndjson' in options:
+    flag = '--bulk' if '--bulk' in options else '--ndjson'
+    position = options.index(flag) + 1
+    source = options[position] if position < len(options) and not options[position].startswith('--') else None
+    if flag == '--ndjson':
+        files = local_files(source)
+    else:
+        status_url = start_export(source or base_url, session,
+                                  type_filters=['Location?address-state=CA'])
+        print('Export started, waiting for files...')
+        files = manifest_files(wait_for_manifest(status_url, session))
+    for resource_type in bulk_types:
+        type_path = output_path if resource_type == 'Location' else f'ca_{carrier}_{resource_type.lower()}.{file_type}'
+        sink = PageSink(type_path)
+        for file_resource_type, file_source in files:
+            if file_resource_type != resource_type:
+                continue
+            resources = iter_ndjson(file_source, session)
+            if resource_type == 'Location': # _typeFilter is optional for servers, so filter here too
+                resources = (resource for resource in resources
+                             if (resource.get('address') or {}).get('state') == 'CA')
+            for entries in iter_entry_pages(resources):
+                sink.write(entries)
+        sink.close()
+        print(f'{resource_type}: {sink.rows} rows written to {type_path}')
+    sys.exit()
 
-# API Calls
-providers = pd.json_normalize(json_object.get('entry'))
-print('Initial Request Successful! Hang tight this will take quite some time...')
-page_number = 1
+# Pick up where the last run stopped or start a fresh pull
+checkpoint = load_checkpoint(checkpoint_path) if resume else None
+if checkpoint is not None:
+    next_url = checkpoint['next_url']
+    page_number = checkpoint['page_number']
+    row_count = checkpoint['row_count']
+    print(f'Resuming after page {page_number} ({row_count} rows)...')
+else:
+    if resume:
+        print('No checkpoint found, starting from page 1')
+    next_url = url
+    page_number = 0
+    row_count = 0
+    print('Hang tight this will take quite some time...')
+sink = PageSink(output_path, append=checkpoint is not None)
 
-while True:
-    try:
-        if page_number % 100 == 0:
-            print(f'Completed: {page_number}')
-        next_url = json_object.get('link')[1].get('url') + add_on
-        next_request = session.get(next_url)
-<<<<<<< HEAD
-        json_object = next_request.json()
-        providers = pd.concat([providers, pd.json_normalize(json_object.get('entry'))])
-        providers.to_csv(f'ca_{carrier}_providers.csv', mode='a', index=False)
-=======
-        next_json = next_request.json()
-        providers = pd.concat([providers, pd.json_normalize(next_json.get('entry'))])
->>>>>>> parent of 6baf739 (general debugging and verify no file)
-        page_number += 1
-    except Exception as e:
-        print(e)
-        print(f'Total Number of Pages: {page_number}')
-        print(f'DataFrame Shape: {providers.shape}')
-        print('Done!')
-        break
\ No newline at end of file
+# API Calls (pages are prefetched in parallel when next links are predictable, see paginate)
+try:
+    if next_url is not None:
+        for bundle in iter_pages(session, next_url, link_suffix=add_on):
+            row_count += sink.write(list(bundle.entries()))
+            page_number += 1
+            next_url = bundle.next_url()
+            if next_url is not None:
+                next_url += add_on
+            if sink.committed: # Only checkpoint pages that are fully on disk
+                save_checkpoint(checkpoint_path, next_url, page_number, row_count)
+            if page_number % 100 == 0:
+                print(f'Completed: {page_number}')
+except Exception as e:
+    print(e)
+    print(f'Stopped after page {page_number}; rerun with --resume to continue')
+sink.close()
+save_checkpoint(checkpoint_path, next_url, page_number, row_count)
+
+if next_url is None:
+    print(f'Total Number of Pages: {page_number}')
+    print(f'Total Number of Rows: {row_count}')
+    print('Done!')
@@ -1,13 +1,15 @@
-import pandas as pd
-import requests
+from fhir_client import get_session
+from page_sink import PageSink
+from stream_json import BundleStream
 
 base_url = 'https://public.fhir.flex.optum.com/R4'
 location_CA = '/Location?_count=100&address-state=CA'
 full_url = base_url + location_CA
-request = requests.get(full_url)
-json_object = request.json()
+session = get_session()
+bundle = BundleStream(session.get(full_url, stream=True))
 
-uhc_providers = pd.json_normalize(json_object.get('entry'))
+uhc_providers = PageSink('ca_uhc_providers.csv')
+uhc_providers.write(list(bundle.entries()))
 print('Initial Request Successful! Hang tight this will take quite some time...')
 page_number = 1
 
@@ -15,13 +17,16 @@ while True:
     try:
         if page_number % 100 == 0:
             print(f'Completed: {page_number}')
-        next_url = json_object.get('link')[1].get('url')
-        next_request = requests.get(next_url)
-        next_json = next_request.json()
-        uhc_providers = pd.concat([uhc_providers, pd.json_normalize(next_json.get('entry'))])
+        next_url = bundle.next_url()
+        if next_url is None: # Last page
+            print('Done!')
+            break
+        bundle = BundleStream(session.get(next_url, stream=True))
+        uhc_providers.write(list(bundle.entries()))
         page_number += 1
     except:
         print('Done!')
         break
 
-uhc_providers.to_csv('ca_uhc_providers.csv', index=False)
\ No newline at end of file
+uhc_providers.close()
+print(f'Total Rows: {uhc_providers.rows}')
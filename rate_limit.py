@@ -0,0 +1,197 @@
+# Import necessary libraries
+import random
+import threading
+import time
+from collections import deque
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+import requests
+
+# Define global variables
+throttle_statuses = (429, 503)
+
+# Define necessary functions
+def parse_retry_after(value):
+    '''
+    Helper function that converts a Retry-After header into seconds
+    -----
+    Input:
+
+    value (str) - Retry-After header (delay in seconds or an HTTP date)
+    -----
+    Output:
+
+    delay (float) - Number of seconds to wait or None if value is missing
+                    or unparseable
+    -----
+    Example:
+
+    >>> parse_retry_after('2')
+    2.0
+    '''
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+class TokenBucket:
+    '''
+    Token bucket pacing requests against a single host. Without a starting
+    rate the host is not paced at all until it first throttles (429/503);
+    from then on the rate adapts with additive increase on success and
+    multiplicative decrease when throttled, so it settles just under the
+    highest rate the host sustains.
+    -----
+    Inputs:
+
+    rate (float) - Starting number of requests per second, or None to start
+                   unthrottled (the adaptive rate then starts at half the
+                   request rate observed when the host first throttles)
+
+    min_rate (float) - Lowest rate the bucket will back off to
+
+    max_rate (float) - Highest rate the bucket will probe up to
+    '''
+    def __init__(self, rate=None, min_rate=0.2, max_rate=100.0):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.tokens = 1.0
+        self.last = time.monotonic()
+        self.paused_until = 0.0
+        self.recent = deque(maxlen=50) # Send times while unthrottled
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        '''
+        Block until a request may be sent
+        '''
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                if self.rate is None: # Unthrottled: only honor a Retry-After pause
+                    if now >= self.paused_until:
+                        self.recent.append(now)
+                        return
+                    wait = self.paused_until - now
+                else:
+                    capacity = max(1.0, self.rate)
+                    self.tokens = min(capacity, self.tokens + (now - self.last) * self.rate)
+                    self.last = now
+                    if now >= self.paused_until and self.tokens >= 1.0:
+                        self.tokens -= 1.0
+                        return
+                    wait = max(self.paused_until - now, (1.0 - self.tokens) / self.rate)
+            time.sleep(wait)
+
+    def observed_rate(self):
+        '''
+        Helper that estimates the recent unthrottled request rate (caller
+        holds the lock)
+        '''
+        if len(self.recent) < 2:
+            return self.max_rate
+        elapsed = self.recent[-1] - self.recent[0]
+        return (len(self.recent) - 1) / elapsed if elapsed > 0 else self.max_rate
+
+    def succeeded(self):
+        '''
+        Probe a slightly higher rate after a successful request
+        '''
+        with self.lock:
+            if self.rate is not None:
+                self.rate = min(self.max_rate, self.rate + 1.0 / max(1.0, self.rate))
+
+    def throttled(self, delay=None):
+        '''
+        Halve the rate after a 429/503 (switching an unthrottled bucket to
+        adaptive pacing) and pause for delay seconds if the server sent
+        Retry-After
+        '''
+        with self.lock:
+            current = self.rate if self.rate is not None else min(self.max_rate, self.observed_rate())
+            self.rate = max(self.min_rate, current / 2)
+            self.tokens = 0.0
+            self.last = time.monotonic()
+            if delay is not None:
+                self.paused_until = max(self.paused_until, time.monotonic() + delay)
+
+class RateLimiter:
+    '''
+    Collection of token buckets, one per host (see TokenBucket)
+    -----
+    Inputs:
+
+    host_limits (dict) - Optional dictionary mapping hosts to TokenBucket
+                         keyword arguments for hosts with a published limit
+                         (e.g. {'nominatim.openstreetmap.org': {'rate': 1.0, 'max_rate': 1.0}})
+
+    **bucket_kwargs - Passed through to every other TokenBucket
+    '''
+    def __init__(self, host_limits=None, **bucket_kwargs):
+        self.host_limits = host_limits or {}
+        self.bucket_kwargs = bucket_kwargs
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def bucket(self, url):
+        '''
+        Return the TokenBucket for url's host, creating it on first use
+        '''
+        host = urlsplit(url).netloc
+        with self.lock:
+            if host not in self.buckets:
+                self.buckets[host] = TokenBucket(**self.host_limits.get(host, self.bucket_kwargs))
+            return self.buckets[host]
+
+class RateLimitedSession(requests.Session):
+    '''
+    requests Session that paces every request with a per-host RateLimiter and
+    retries 429/503 responses, honoring Retry-After and otherwise backing off
+    exponentially with full jitter
+    -----
+    Inputs:
+
+    rate_limiter (RateLimiter) - Per-host pacing; a default one is created if None
+
+    max_retries (int) - Number of retries of a throttled request before the
+                        throttled response is returned
+
+    backoff_factor (float) - Base delay in seconds for jittered backoff
+
+    max_backoff (float) - Longest single backoff delay in seconds
+    '''
+    def __init__(self, rate_limiter=None, max_retries=8, backoff_factor=1.0, max_backoff=60.0):
+        super().__init__()
+        self.rate_limiter = rate_limiter if rate_limiter is not None else RateLimiter()
+        self.max_retries = max_retries
+        self.backoff_factor = backoff_factor
+        self.max_backoff = max_backoff
+
+    def send(self, request, **kwargs):
+        bucket = self.rate_limiter.bucket(request.url)
+        attempt = 0
+        while True:
+            bucket.acquire()
+            response = super().send(request, **kwargs)
+            if response.status_code not in throttle_statuses:
+                bucket.succeeded()
+                return response
+            delay = parse_retry_after(response.headers.get('Retry-After'))
+            bucket.throttled(delay)
+            if attempt >= self.max_retries:
+                print(f'Still throttled after {attempt} retries: {request.url}')
+                return response
+            if delay is None:
+                delay = random.uniform(0, min(self.max_backoff,
+                                              self.backoff_factor * 2 ** attempt))
+            print(f'Throttled ({response.status_code}), retrying in {delay:.1f}s...')
+            response.close()
+            time.sleep(delay)
+            attempt += 1
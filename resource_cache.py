@@ -0,0 +1,126 @@
+# Import necessary libraries
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+class ResourceCache:
+    '''
+    Two tier cache for FHIR resources keyed by full resource API call
+    (carrier base URL + reference, e.g. base_url + 'Location/123')
+
+    Tier 1 is an in-process LRU holding at most max_entries json objects.
+    Tier 2 is an optional sqlite file on disk whose entries expire after
+    ttl seconds, so repeated references are free both within a run and
+    across runs.
+    -----
+    Inputs:
+
+    max_entries (int) - Maximum number of resources kept in memory
+
+    path (str) - Optional path of the sqlite file used as the on-disk tier
+
+    ttl (int) - Number of seconds an on-disk entry stays valid
+    '''
+    def __init__(self, max_entries=10000, path=None, ttl=86400):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.conn = None
+        if path is not None:
+            self.conn = sqlite3.connect(path, check_same_thread=False)
+            self.conn.execute('CREATE TABLE IF NOT EXISTS resources ('
+                              'key TEXT PRIMARY KEY, '
+                              'body TEXT NOT NULL, '
+                              'stored REAL NOT NULL)')
+            self.conn.commit()
+
+    def get(self, key):
+        '''
+        Look up key in memory and then on disk
+        -----
+        Input:
+
+        key (str) - Full resource API call
+        -----
+        Output:
+
+        json_object (dict) - Cached json object or None on a miss
+        '''
+        with self.lock:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                self.hits += 1
+                return self.memory[key]
+            if self.conn is not None:
+                row = self.conn.execute('SELECT body, stored FROM resources WHERE key = ?',
+                                        (key,)).fetchone()
+                if row is not None and time.time() - row[1] < self.ttl:
+                    json_object = json.loads(row[0])
+                    self.remember(key, json_object)
+                    self.hits += 1
+                    return json_object
+            self.misses += 1
+            return None
+
+    def set(self, key, json_object):
+        '''
+        Store json_object under key in memory and, if enabled, on disk
+        -----
+        Inputs:
+
+        key (str) - Full resource API call
+
+        json_object (dict) - Resource to cache; None is never cached
+        '''
+        if json_object is None:
+            return
+        with self.lock:
+            self.remember(key, json_object)
+            if self.conn is not None:
+                self.conn.execute('INSERT OR REPLACE INTO resources VALUES (?, ?, ?)',
+                                  (key, json.dumps(json_object), time.time()))
+                self.conn.commit()
+
+    def set_many(self, items):
+        '''
+        Store several resources at once with a single disk commit
+        -----
+        Input:
+
+        items (dict) - Dictionary mapping full resource API calls to json objects
+        '''
+        items = {key: json_object for key, json_object in items.items()
+                 if json_object is not None}
+        with self.lock:
+            for key, json_object in items.items():
+                self.remember(key, json_object)
+            if self.conn is not None and items:
+                now = time.time()
+                self.conn.executemany('INSERT OR REPLACE INTO resources VALUES (?, ?, ?)',
+                                      [(key, json.dumps(json_object), now)
+                                       for key, json_object in items.items()])
+                self.conn.commit()
+
+    def remember(self, key, json_object):
+        '''
+        Helper that inserts into the in-memory tier and evicts the least
+        recently used entries past max_entries (caller holds the lock)
+        '''
+        self.memory[key] = json_object
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    def close(self):
+        '''
+        Close the on-disk tier and print hit/miss counts
+        '''
+        print(f'Resource cache: {self.hits} hit(s), {self.misses} miss(es)')
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
@@ -0,0 +1,130 @@
+# Import necessary libraries
+import os.path
+import re
+import numpy as np
+import pandas as pd
+from distance import haversine, valid_coordinates
+try:
+    from scipy.spatial import cKDTree
+except ImportError: # scipy is optional; without it nearest places are found by chunked brute force
+    cKDTree = None
+
+# Define global variables
+place_suffix = re.compile(r'\s+(city|town|CDP|village|municipality|borough)$')
+chunk_size = 4096 # Number of points compared against every place at once (brute force)
+
+# Define necessary functions
+def to_unit_vectors(latitudes, longitudes):
+    '''
+    Helper function that converts coordinates in degrees to points on the unit
+    sphere, where straight-line distance orders the same as great-circle distance
+    '''
+    lat = np.radians(np.asarray(latitudes, dtype=float))
+    lon = np.radians(np.asarray(longitudes, dtype=float))
+    return np.column_stack([np.cos(lat) * np.cos(lon),
+                            np.cos(lat) * np.sin(lon),
+                            np.sin(lat)])
+
+class PlaceIndex:
+    '''
+    Offline reverse geocoder that maps coordinates to the nearest place
+    centroid, with a KD-tree when scipy is installed and chunked NumPy
+    haversine comparisons otherwise
+    -----
+    Inputs:
+
+    names (list) - List of place names
+
+    latitudes, longitudes (array) - Place centroid coordinates in degrees
+
+    max_distance (float) - Points farther than this many kilometers from every
+                           centroid resolve to None
+    -----
+    Example:
+
+    >>> index = load_place_index('2023_Gaz_place_national.txt')
+    >>> index.lookup([37.8716], [-122.2727])
+    array(['Berkeley'], dtype=object)
+    '''
+    def __init__(self, names, latitudes, longitudes, max_distance=15.0):
+        self.names = np.asarray(names, dtype=object)
+        self.latitudes = np.asarray(latitudes, dtype=float)
+        self.longitudes = np.asarray(longitudes, dtype=float)
+        self.max_distance = max_distance
+        self.tree = None
+        if cKDTree is not None and len(self.names):
+            self.tree = cKDTree(to_unit_vectors(self.latitudes, self.longitudes))
+
+    def nearest(self, latitudes, longitudes):
+        '''
+        Helper that returns the index of the nearest centroid to each point
+        (all points must be valid)
+        '''
+        if self.tree is not None:
+            return self.tree.query(to_unit_vectors(latitudes, longitudes))[1]
+        positions = np.empty(len(latitudes), dtype=int)
+        for start in range(0, len(latitudes), chunk_size):
+            stop = start + chunk_size
+            distances = haversine(latitudes[start:stop, None], longitudes[start:stop, None],
+                                  self.latitudes[None, :], self.longitudes[None, :])
+            positions[start:stop] = distances.argmin(axis=1)
+        return positions
+
+    def lookup(self, latitudes, longitudes):
+        '''
+        Resolve a whole column of coordinates to place names in one batch
+        -----
+        Inputs:
+
+        latitudes, longitudes (array) - Coordinates in degrees; strings are
+                                        converted and unparseable values are missing
+        -----
+        Output:
+
+        cities (array) - Object array of place names (None where a point is
+                         missing, invalid or too far from every place)
+        '''
+        latitudes = pd.to_numeric(pd.Series(latitudes), errors='coerce').to_numpy(dtype=float)
+        longitudes = pd.to_numeric(pd.Series(longitudes), errors='coerce').to_numpy(dtype=float)
+        cities = np.full(len(latitudes), None, dtype=object)
+        valid = valid_coordinates(latitudes, longitudes)
+        if not valid.any() or not len(self.names):
+            return cities
+        positions = self.nearest(latitudes[valid], longitudes[valid])
+        distances = haversine(latitudes[valid], longitudes[valid],
+                              self.latitudes[positions], self.longitudes[positions])
+        names = self.names[positions]
+        names[distances > self.max_distance] = None
+        cities[valid] = names
+        return cities
+
+def load_place_index(path, state='CA', max_distance=15.0):
+    '''
+    Function that builds a PlaceIndex from a Census Gazetteer places file
+    (tab-delimited with USPS, NAME, INTPTLAT and INTPTLONG columns, e.g.
+    2023_Gaz_place_national.txt from census.gov)
+    -----
+    Inputs:
+
+    path (str) - Path of the gazetteer file
+
+    state (str) - Postal code of the state to keep (None keeps every state)
+
+    max_distance (float) - See PlaceIndex
+    -----
+    Output:
+
+    index (PlaceIndex) - Index of place centroids or None if path does not exist
+    '''
+    if not os.path.exists(path):
+        print(f'Gazetteer {path} not found, offline reverse geocoding disabled')
+        return None
+    places = pd.read_csv(path, sep='\t', dtype=str)
+    places.columns = places.columns.str.strip() # Last header carries trailing spaces
+    if state is not None:
+        places = places[places['USPS'] == state]
+    names = places['NAME'].str.replace(place_suffix, '', regex=True)
+    return PlaceIndex(names.to_numpy(dtype=object),
+                      pd.to_numeric(places['INTPTLAT']).to_numpy(),
+                      pd.to_numeric(places['INTPTLONG']).to_numpy(),
+                      max_distance=max_distance)
@@ -0,0 +1,66 @@
+# Import necessary libraries
+import threading
+
+class SeenSet:
+    '''
+    Crawl-wide record of the resources already processed, keyed by
+    (resource type, id), so that a resource returned by several overlapping
+    searches (neighboring cities, several specialty codes, repeated pages) is
+    parsed and resolved only once. Safe to share between crawl threads.
+    -----
+    Example:
+
+    >>> seen = SeenSet()
+    >>> seen.claim('HealthcareService', '123')
+    True
+    >>> seen.claim('HealthcareService', '123')
+    False
+    '''
+    def __init__(self):
+        self.keys = set()
+        self.lock = threading.Lock()
+        self.skipped = 0
+
+    def claim(self, resource_type, resource_id):
+        '''
+        Mark a resource as processed
+        -----
+        Inputs:
+
+        resource_type (str) - FHIR resource type (e.g. 'Location')
+
+        resource_id (str) - Resource id
+        -----
+        Output:
+
+        first (bool) - True if the caller is the first to see the resource and
+                       should process it, False if it is a duplicate
+        '''
+        key = (resource_type, resource_id)
+        with self.lock:
+            if key in self.keys:
+                self.skipped += 1
+                return False
+            self.keys.add(key)
+            return True
+
+    def claim_entry(self, entry):
+        '''
+        Helper that claims the resource of a Bundle entry (see claim)
+        '''
+        resource = entry.get('resource') or {}
+        return self.claim(resource.get('resourceType'), resource.get('id'))
+
+    def __contains__(self, key):
+        with self.lock:
+            return key in self.keys
+
+    def __len__(self):
+        with self.lock:
+            return len(self.keys)
+
+    def report(self):
+        '''
+        Print the number of unique resources and skipped duplicates
+        '''
+        print(f'Seen {len(self)} unique resources, skipped {self.skipped} duplicates')
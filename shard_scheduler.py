@@ -0,0 +1,53 @@
+# Import necessary libraries
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+# Define global variables
+max_workers = 16 # Total number of shards crawled at once
+max_per_host = 4 # Number of shards crawled at once against any single host
+
+# Define necessary functions
+def run_shards(shards, crawl_shard, shard_url, workers=max_workers, per_host=max_per_host):
+    '''
+    Function that crawls independent shards (e.g. one (resource, city, specialty)
+    search each) on a worker pool with a cap on concurrent shards per host.
+    Each shard is handled by a single call to crawl_shard, so pagination stays
+    sequential within a shard while different shards run in parallel.
+    -----
+    Inputs:
+
+    shards (list) - List of shards (any hashable description of one search)
+
+    crawl_shard (function) - Function taking a shard and returning its results
+
+    shard_url (function) - Function taking a shard and returning its first
+                           API call (used to find the shard's host)
+
+    workers (int) - Size of the worker pool
+
+    per_host (int) - Maximum number of shards crawled at once per host
+    -----
+    Output:
+
+    results (list) - Results of crawl_shard in the same order as shards
+    '''
+    host_slots = {}
+    for shard in shards:
+        host = urlsplit(shard_url(shard)).netloc
+        if host not in host_slots:
+            host_slots[host] = threading.Semaphore(per_host)
+    done = [0]
+    done_lock = threading.Lock()
+
+    def run(shard):
+        with host_slots[urlsplit(shard_url(shard)).netloc]:
+            result = crawl_shard(shard)
+        with done_lock:
+            done[0] += 1
+            if done[0] % 25 == 0:
+                print(f'Completed {done[0]} of {len(shards)} shards')
+        return result
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        return list(executor.map(run, shards))
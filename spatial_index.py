@@ -0,0 +1,197 @@
+# Import necessary libraries
+import math
+import numpy as np
+import pandas as pd
+from distance import haversine, valid_coordinates
+from provider_index import ProviderIndex, table_columns
+
+# Define global variables
+km_per_degree = 111.19 # Length of one degree of latitude
+default_cell_size = 0.02 # Grid cell size in degrees (about 2 km)
+
+class SpatialIndex:
+    '''
+    Grid-bucket spatial index over point coordinates. Points are sorted by
+    grid cell so each cell is a contiguous slice; radius and k-nearest queries
+    only compute exact haversine distances for points in nearby cells.
+    -----
+    Inputs:
+
+    latitudes, longitudes (array) - Point coordinates in degrees; missing or
+                                    invalid coordinates are never returned
+
+    cell_size (float) - Grid cell size in degrees
+    '''
+    def __init__(self, latitudes, longitudes, cell_size=default_cell_size):
+        latitudes = pd.to_numeric(pd.Series(latitudes), errors='coerce').to_numpy(dtype=float)
+        longitudes = pd.to_numeric(pd.Series(longitudes), errors='coerce').to_numpy(dtype=float)
+        self.cell_size = cell_size
+        self.columns = math.ceil(360 / cell_size) + 1
+        self.latitudes = latitudes
+        self.longitudes = longitudes
+        rows = np.flatnonzero(valid_coordinates(latitudes, longitudes))
+        keys = self.cell_keys(latitudes[rows], longitudes[rows])
+        order = np.argsort(keys, kind='stable')
+        self.rows = rows[order]
+        self.keys, self.starts, counts = np.unique(keys[order], return_index=True, return_counts=True)
+        self.ends = self.starts + counts
+        self.key_lats, self.key_lons = np.divmod(self.keys, self.columns)
+        self.max_ring = math.ceil(180 / cell_size)
+
+    def cell_keys(self, latitudes, longitudes):
+        '''
+        Helper that returns the grid cell key of each point
+        '''
+        lat_cells = np.floor((np.asarray(latitudes) + 90) / self.cell_size).astype(np.int64)
+        lon_cells = np.floor((np.asarray(longitudes) + 180) / self.cell_size).astype(np.int64)
+        return lat_cells * self.columns + lon_cells
+
+    def candidates(self, lat, lon, lat_ring, lon_ring):
+        '''
+        Helper that returns the rows in the block of cells within lat_ring
+        cells (north/south) and lon_ring cells (east/west) of (lat, lon)
+        '''
+        center = int(self.cell_keys(lat, lon))
+        if (2 * lat_ring + 1) * (2 * lon_ring + 1) > len(self.keys):
+            # Large block: filter the occupied cells instead of listing every cell
+            center_lat, center_lon = divmod(center, self.columns)
+            positions = np.flatnonzero((np.abs(self.key_lats - center_lat) <= lat_ring)
+                                       & (np.abs(self.key_lons - center_lon) <= lon_ring))
+        else:
+            lat_offsets = np.arange(-lat_ring, lat_ring + 1) * self.columns
+            lon_offsets = np.arange(-lon_ring, lon_ring + 1)
+            wanted = (center + lat_offsets[:, None] + lon_offsets[None, :]).ravel()
+            positions = np.searchsorted(self.keys, wanted)
+            positions = positions[positions < len(self.keys)]
+            positions = np.unique(positions[np.isin(self.keys[positions], wanted)])
+        # Gather the slices of every selected cell without a Python loop
+        lengths = self.ends[positions] - self.starts[positions]
+        offsets = np.repeat(self.starts[positions] - np.cumsum(lengths) + lengths, lengths)
+        return self.rows[offsets + np.arange(lengths.sum())]
+
+    def rings(self, lat, radius):
+        '''
+        Helper that converts a radius in km into cell rings around latitude lat
+        '''
+        lat_ring = math.ceil(radius / km_per_degree / self.cell_size)
+        cos_lat = max(math.cos(math.radians(min(abs(lat) + lat_ring * self.cell_size, 89.9))), 1e-6)
+        lon_ring = math.ceil(radius / (km_per_degree * cos_lat) / self.cell_size)
+        return min(lat_ring, self.max_ring), min(lon_ring, self.columns)
+
+    def within(self, lat, lon, radius, allowed=None):
+        '''
+        Rows within radius km of (lat, lon), nearest first
+        -----
+        Inputs:
+
+        lat, lon (float) - Query point in degrees
+
+        radius (float) - Search radius in kilometers
+
+        allowed (array) - Optional boolean mask of rows that may be returned
+        -----
+        Outputs:
+
+        rows (array) - Row ids sorted by distance
+
+        distances (array) - Distances in kilometers
+        '''
+        rows = self.candidates(lat, lon, *self.rings(lat, radius))
+        if allowed is not None:
+            rows = rows[allowed[rows]]
+        distances = haversine(lat, lon, self.latitudes[rows], self.longitudes[rows])
+        keep = distances <= radius
+        rows, distances = rows[keep], distances[keep]
+        order = np.argsort(distances, kind='stable')
+        return rows[order], distances[order]
+
+    def nearest(self, lat, lon, k=10, allowed=None):
+        '''
+        The k rows nearest to (lat, lon); the search widens ring by ring
+        until k candidates are found and is then settled exactly with within
+        -----
+        Inputs:
+
+        lat, lon (float) - Query point in degrees
+
+        k (int) - Number of rows to return
+
+        allowed (array) - Optional boolean mask of rows that may be returned
+        -----
+        Outputs:
+
+        rows (array) - Up to k row ids sorted by distance
+
+        distances (array) - Distances in kilometers
+        '''
+        ring = 1
+        while True:
+            rows = self.candidates(lat, lon, ring, self.rings(lat, ring * self.cell_size * km_per_degree)[1])
+            if allowed is not None:
+                rows = rows[allowed[rows]]
+            if len(rows) >= k or ring >= self.max_ring:
+                break
+            ring *= 2
+        if not len(rows):
+            return rows, np.zeros(0)
+        distances = haversine(lat, lon, self.latitudes[rows], self.longitudes[rows])
+        # Points outside the searched block may still beat the k-th candidate
+        radius = float(np.partition(distances, min(k, len(rows)) - 1)[min(k, len(rows)) - 1])
+        rows, distances = self.within(lat, lon, radius, allowed)
+        return rows[:k], distances[:k]
+
+class ProviderSearch:
+    '''
+    "Providers near me" search over a providers snapshot combining the
+    SpatialIndex with the facet bitmaps of provider_index.ProviderIndex
+    -----
+    Inputs:
+
+    providers (DataFrame) - providers.csv or the providers table
+
+    cell_size (float) - Grid cell size in degrees (see SpatialIndex)
+    -----
+    Example:
+
+    >>> search = ProviderSearch(pd.read_csv('providers.csv'))
+    >>> search.nearest(37.8716, -122.2727, k=5,
+    ...                filters={'carrier': 'Kaiser', 'networks': ['Kaiser HMO Network'],
+    ...                         'specialties': ['Psychiatry']})
+    '''
+    def __init__(self, providers, cell_size=default_cell_size):
+        self.index = ProviderIndex(providers)
+        self.providers = self.index.providers
+        latitude = 'Latitude' if 'Latitude' in self.providers else 'latitude'
+        longitude = 'Longitude' if 'Longitude' in self.providers else 'longitude'
+        self.spatial = SpatialIndex(self.providers[latitude], self.providers[longitude], cell_size)
+
+    def allowed(self, filters):
+        '''
+        Helper that turns ProviderIndex.query keyword arguments into a row mask
+        '''
+        if not filters:
+            return None
+        mask = np.zeros(len(self.providers), dtype=bool)
+        mask[self.index.positions(self.index.query(**filters))] = True
+        return mask
+
+    def result(self, rows, distances):
+        '''
+        Helper that returns the matching providers with a Distance (km) column
+        '''
+        found = self.providers.iloc[rows].copy()
+        found['Distance'] = distances
+        return found
+
+    def nearest(self, lat, lon, k=10, filters=None):
+        '''
+        The k providers nearest to (lat, lon) that match filters (keyword
+        arguments of ProviderIndex.query: carrier, networks, specialties, cities)
+        '''
+        return self.result(*self.spatial.nearest(lat, lon, k, self.allowed(filters)))
+
+    def within(self, lat, lon, radius, filters=None):
+        '''
+        Providers within radius km of (lat, lon) that match filters, nearest first
+        '''
+        return self.result(*self.spatial.within(lat, lon, radius, self.allowed(filters)))
@@ -0,0 +1,151 @@
+# Import necessary libraries
+import json
+try:
+    import ijson # Picks its fastest compiled backend (yajl2_c) when available
+except ImportError: # ijson is optional; without it Bundles are parsed in one piece
+    ijson = None
+try:
+    import orjson
+    loads = orjson.loads
+except ImportError:
+    loads = json.loads
+
+class ResponseReader:
+    '''
+    Minimal file-like wrapper around a streamed requests Response so an
+    incremental parser can consume the body while it is still downloading
+    -----
+    Inputs:
+
+    response (Response) - Response requested with stream=True
+
+    chunk_size (int) - Number of bytes pulled from the socket at a time
+    '''
+    def __init__(self, response, chunk_size=64 * 1024):
+        self.chunks = response.iter_content(chunk_size=chunk_size)
+        self.buffer = b''
+
+    def read(self, size=-1):
+        while size < 0 or len(self.buffer) < size:
+            try:
+                self.buffer += next(self.chunks)
+            except StopIteration:
+                break
+        if size < 0:
+            size = len(self.buffer)
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+class BundleStream:
+    '''
+    Incremental reader for a FHIR search Bundle that yields entry[] items one
+    at a time as they arrive, so only about one resource is held in memory and
+    parsing overlaps with the network transfer. Bundle-level total and link
+    are available as soon as they have been read (servers normally send them
+    before entry, and they are always available once entries() is exhausted).
+
+    Falls back to parsing the whole body (with orjson when installed) if ijson
+    is not installed.
+    -----
+    Input:
+
+    response (Response) - Response requested with stream=True
+    -----
+    Example:
+
+    >>> bundle = BundleStream(session.get(url, stream=True))
+    >>> for entry in bundle.entries():
+    ...     resource = entry['resource']
+    >>> next_url = bundle.next_url()
+    '''
+    def __init__(self, response):
+        self.total = None
+        self.links = []
+        self.resource_type = None
+        self.issue = None
+        if ijson is None:
+            json_object = loads(response.content)
+            self.read_header(json_object)
+            self.events = None
+            self.buffered = json_object.get('entry') or []
+        else:
+            self.events = ijson.parse(ResponseReader(response), use_float=True)
+            self.buffered = None
+            self.read_until_entries()
+
+    def read_header(self, json_object):
+        '''
+        Helper that copies Bundle-level fields from a fully parsed body
+        '''
+        self.total = json_object.get('total')
+        self.links = json_object.get('link') or []
+        self.resource_type = json_object.get('resourceType')
+        self.issue = json_object.get('issue')
+
+    def handle_event(self, prefix, event, value):
+        '''
+        Helper that records a Bundle-level event; returns True when the event
+        opens the entry array
+        '''
+        if prefix == 'entry' and event == 'start_array':
+            return True
+        if prefix == 'total' and event == 'number':
+            self.total = int(value)
+        elif prefix == 'resourceType' and event == 'string':
+            self.resource_type = value
+        elif prefix in ('link.item', 'issue.item') and event == 'start_map':
+            item = self.build_object(prefix, event, value)
+            if prefix == 'link.item':
+                self.links.append(item)
+            else:
+                self.issue = (self.issue or []) + [item]
+        return False
+
+    def build_object(self, prefix, event, value):
+        '''
+        Helper that consumes events until the object starting at prefix ends
+        '''
+        builder = ijson.ObjectBuilder()
+        builder.event(event, value)
+        for item_prefix, item_event, item_value in self.events:
+            builder.event(item_event, item_value)
+            if item_prefix == prefix and item_event == 'end_map':
+                return builder.value
+
+    def read_until_entries(self):
+        '''
+        Helper that reads Bundle-level fields up to the start of entry[]
+        '''
+        for prefix, event, value in self.events:
+            if self.handle_event(prefix, event, value):
+                return
+
+    def entries(self):
+        '''
+        Generator that yields each entry[] item (a dict with 'resource')
+        -----
+        Output:
+
+        entry (dict) - One Bundle entry
+        '''
+        if self.events is None:
+            yield from self.buffered
+            self.buffered = []
+            return
+        for prefix, event, value in self.events:
+            if prefix == 'entry.item' and event == 'start_map':
+                yield self.build_object(prefix, event, value)
+            elif prefix == 'entry' and event == 'end_array':
+                break
+        # Read any Bundle-level fields sent after entry[]
+        for prefix, event, value in self.events:
+            self.handle_event(prefix, event, value)
+
+    def next_url(self):
+        '''
+        Return the Bundle's next-page link or None on the last page
+        '''
+        for link in self.links:
+            if link.get('relation') == 'next':
+                return link.get('url')
+        return None
@@ -1,8 +1,6 @@
 import pandas as pd
 import sys
-import requests
-from requests.adapters import HTTPAdapter
-from requests.packages.urllib3.util.retry import Retry
+from fhir_client import get_session
 
 # Determine carrier from commmand line
 carrier = sys.argv[1]
@@ -14,11 +12,7 @@ elif carrier == 'anthem':
     add_on = '&address-state=CA'
 
 # Pull data from carrier API
-session = requests.Session()
-retry = Retry(connect=5, backoff_factor=2)
-adapter = HTTPAdapter(max_retries=retry)
-session.mount('http://', adapter)
-session.mount('https://', adapter)
+session = get_session()
 request = session.get(url)
 json_object = request.json()
 